@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import platform
+from typing import Callable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+_AT_FDCWD = -100
+_AT_SYMLINK_NOFOLLOW = 0x100
+_STATX_BTIME = 0x800
+
+# statx syscall numbers, used when libc predates the statx() wrapper (glibc < 2.28).
+_SYS_STATX = {
+    "x86_64": 332,
+    "amd64": 332,
+    "aarch64": 291,
+    "arm64": 291,
+    "armv7l": 397,
+    "armv6l": 397,
+    "i686": 383,
+    "i386": 383,
+}
+
+
+class _StatxTimestamp(ctypes.Structure):
+    _fields_ = [
+        ("tv_sec", ctypes.c_int64),
+        ("tv_nsec", ctypes.c_uint32),
+        ("_reserved", ctypes.c_int32),
+    ]
+
+
+class _Statx(ctypes.Structure):
+    _fields_ = [
+        ("stx_mask", ctypes.c_uint32),
+        ("stx_blksize", ctypes.c_uint32),
+        ("stx_attributes", ctypes.c_uint64),
+        ("stx_nlink", ctypes.c_uint32),
+        ("stx_uid", ctypes.c_uint32),
+        ("stx_gid", ctypes.c_uint32),
+        ("stx_mode", ctypes.c_uint16),
+        ("_spare0", ctypes.c_uint16),
+        ("stx_ino", ctypes.c_uint64),
+        ("stx_size", ctypes.c_uint64),
+        ("stx_blocks", ctypes.c_uint64),
+        ("stx_attributes_mask", ctypes.c_uint64),
+        ("stx_atime", _StatxTimestamp),
+        ("stx_btime", _StatxTimestamp),
+        ("stx_ctime", _StatxTimestamp),
+        ("stx_mtime", _StatxTimestamp),
+        ("stx_rdev_major", ctypes.c_uint32),
+        ("stx_rdev_minor", ctypes.c_uint32),
+        ("stx_dev_major", ctypes.c_uint32),
+        ("stx_dev_minor", ctypes.c_uint32),
+        ("_spare2", ctypes.c_uint64 * 14),
+    ]
+
+
+def _stat_birthtime(path: str) -> Optional[float]:
+    try:
+        btime = os.stat(path).st_birthtime
+    except (OSError, AttributeError):
+        return None
+    return float(btime) if btime else None
+
+
+def _make_statx() -> Optional[Callable[[str], Optional[float]]]:
+    if platform.system() != "Linux":
+        return None
+    libc_name = ctypes.util.find_library("c")
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+    except OSError:
+        return None
+
+    statx_fn = getattr(libc, "statx", None)
+    if statx_fn is not None:
+        statx_fn.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint, ctypes.POINTER(_Statx)]
+        statx_fn.restype = ctypes.c_int
+
+        def call(path_b: bytes, buf: _Statx) -> int:
+            return statx_fn(_AT_FDCWD, path_b, _AT_SYMLINK_NOFOLLOW, _STATX_BTIME, ctypes.byref(buf))
+    else:
+        nr = _SYS_STATX.get(platform.machine().lower())
+        if nr is None:
+            return None
+        syscall = libc.syscall
+        syscall.restype = ctypes.c_long
+
+        def call(path_b: bytes, buf: _Statx) -> int:
+            return syscall(
+                ctypes.c_long(nr),
+                ctypes.c_int(_AT_FDCWD),
+                ctypes.c_char_p(path_b),
+                ctypes.c_int(_AT_SYMLINK_NOFOLLOW),
+                ctypes.c_uint(_STATX_BTIME),
+                ctypes.byref(buf),
+            )
+
+    def statx_birthtime(path: str) -> Optional[float]:
+        buf = _Statx()
+        if call(os.fsencode(path), buf) != 0:
+            return None
+        # The filesystem may not record birth time at all (e.g. NFS, older ext).
+        if not buf.stx_mask & _STATX_BTIME or buf.stx_btime.tv_sec == 0:
+            return None
+        return buf.stx_btime.tv_sec + buf.stx_btime.tv_nsec / 1e9
+
+    return statx_birthtime
+
+
+class BirthTimeProvider:
+    """Reads folder creation (birth) times in-process.
+
+    The backend is chosen once by probing a real path: os.stat's
+    st_birthtime where the platform exposes it (macOS, BSD, Windows), else
+    the Linux statx syscall through ctypes. If neither reports a birth time
+    for the probe path, every lookup returns None without touching the disk.
+    """
+
+    def __init__(self, name: str, func: Callable[[str], Optional[float]]) -> None:
+        self.name = name
+        self._func = func
+
+    def __call__(self, path: str) -> Optional[float]:
+        return self._func(path)
+
+    @classmethod
+    def probe(cls, path: str) -> "BirthTimeProvider":
+        if hasattr(os.stat_result, "st_birthtime") and _stat_birthtime(path) is not None:
+            return cls("st_birthtime", _stat_birthtime)
+
+        statx = _make_statx()
+        if statx is not None and statx(path) is not None:
+            return cls("statx", statx)
+
+        return cls("none", lambda path: None)
+
+
+_provider: Optional[BirthTimeProvider] = None
+
+
+def get_birthtime_provider(probe_path: str) -> BirthTimeProvider:
+    """Return the process-wide provider, probing probe_path on first use."""
+    global _provider
+    if _provider is None:
+        _provider = BirthTimeProvider.probe(probe_path)
+        logger.info(f"Folder birth time provider: {_provider.name}")
+    return _provider
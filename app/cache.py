@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe least-recently-used cache with hit/miss counters.
+
+    Bounded by entry count and, with weigh (e.g. len for bytes), by total
+    weight; a value heavier than a quarter of max_weight is not kept.
+    """
+
+    def __init__(self, maxsize: int, max_weight: int = 0, weigh: Optional[Callable[[V], int]] = None) -> None:
+        self.maxsize = maxsize
+        self.max_weight = max_weight
+        self.hits = 0
+        self.misses = 0
+        self._weigh = weigh
+        self._weight = 0
+        self._items: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def put(self, key: Hashable, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        weight = self._weigh(value) if self._weigh is not None else 0
+        if self._weigh is not None and weight * 4 > self.max_weight:
+            return
+        with self._lock:
+            self._discard_locked(key)
+            self._items[key] = value
+            self._weight += weight
+            while len(self._items) > self.maxsize or (self._weigh is not None and self._weight > self.max_weight):
+                self._discard_locked(next(iter(self._items)))
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._discard_locked(key)
+
+    def _discard_locked(self, key: Hashable) -> None:
+        value = self._items.pop(key, None)
+        if value is not None and self._weigh is not None:
+            self._weight -= self._weigh(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._weight = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+            if self._weigh is not None:
+                stats["bytes"] = self._weight
+            return stats
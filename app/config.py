@@ -12,5 +12,45 @@ MUSIC_DIR = os.getenv("MUSIC_DIR", "/music")
 DATA_DIR = os.getenv("DATA_DIR", "/data")
 SCAN_ON_START = _get_env_bool("SCAN_ON_START", True)
 
+# Persist the scanned library under DATA_DIR so restarts can serve immediately
+# while the filesystem is reconciled in the background.
+LIBRARY_INDEX = _get_env_bool("LIBRARY_INDEX", True)
+
+# Tag parsing pool used by scans. 0 parses serially in the scanning thread.
+# "thread" suits network mounts, "process" suits CPU-bound parsing on local disks.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "0"))
+SCAN_EXECUTOR = os.getenv("SCAN_EXECUTOR", "thread").strip().lower()
+# "partial" reads only the tag region of each file (no picture payloads),
+# which saves most of the I/O on network mounts; "mutagen" parses whole tags.
+SCAN_TAG_READER = os.getenv("SCAN_TAG_READER", "mutagen").strip().lower()
+
+# Keep the library live without rescans: "off", "auto" (inotify, or polling on
+# network mounts), "inotify" or "poll".
+WATCH_MODE = os.getenv("WATCH_MODE", "off").strip().lower()
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "5"))
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "300"))
+WATCH_MAX_DIRS = int(os.getenv("WATCH_MAX_DIRS", "65536"))
+
+# Run several workers (uvicorn --workers N) off one library: a single process
+# scans and publishes it to DATA_DIR/library.map, which the others map read-only
+# and check for new versions every SHARED_POLL_SECONDS. The player queue is
+# shared as well.
+SHARED_LIBRARY = _get_env_bool("SHARED_LIBRARY", False)
+SHARED_POLL_SECONDS = float(os.getenv("SHARED_POLL_SECONDS", "1"))
+
+# Generated /api/queue/batch responses kept for seeded and cursor requests.
+BATCH_CACHE_SIZE = int(os.getenv("BATCH_CACHE_SIZE", "256"))
+
+# Memory for hot cover images, in megabytes (0 reads them from disk every time).
+COVER_CACHE_MB = int(os.getenv("COVER_CACHE_MB", "32"))
+
+# Resolve every track's cover (and thumbnails) in the background after scans,
+# at most COVER_PREFETCH_RATE tracks per second (0 = unthrottled), pausing while
+# COVER_PREFETCH_PAUSE_STREAMS or more audio streams are being sent (0 = never).
+COVER_PREFETCH = _get_env_bool("COVER_PREFETCH", False)
+COVER_PREFETCH_WORKERS = int(os.getenv("COVER_PREFETCH_WORKERS", "2"))
+COVER_PREFETCH_RATE = float(os.getenv("COVER_PREFETCH_RATE", "20"))
+COVER_PREFETCH_PAUSE_STREAMS = int(os.getenv("COVER_PREFETCH_PAUSE_STREAMS", "2"))
+
 # In-memory only by default. If enabled, the queue will be re-generated periodically.
 QUEUE_REFRESH_SECONDS = int(os.getenv("QUEUE_REFRESH_SECONDS", "0"))
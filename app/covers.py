@@ -1,10 +1,27 @@
 from __future__ import annotations
 
+import hashlib
+import io
+import json
+import logging
+import mimetypes
 import os
-from typing import Optional, Tuple
+import re
+import threading
+from typing import Dict, Optional, Set, Tuple
 
 from mutagen import File as MutagenFile
 
+from .cache import LRUCache
+from .models import Track
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional: without Pillow every size serves the original
+    Image = None
+
+logger = logging.getLogger(__name__)
+
 
 def _safe_mkdir(path: str) -> None:
     os.makedirs(path, exist_ok=True)
@@ -27,15 +44,8 @@ def _guess_ext_from_mime(mime: Optional[str]) -> str:
     return ".jpg"
 
 
-def extract_embedded_cover(audio_abs_path: str) -> Optional[Tuple[bytes, str]]:
-    try:
-        mf = MutagenFile(audio_abs_path)
-    except Exception:
-        return None
-    
-    if mf is None:
-        return None
-
+def embedded_picture(mf) -> Optional[Tuple[bytes, Optional[str]]]:
+    """(image bytes, MIME type) of the first picture in a parsed mutagen file."""
     # MP3 (ID3 APIC)
     tags = getattr(mf, "tags", None)
     if tags is not None and hasattr(tags, "getall"):
@@ -45,7 +55,7 @@ def extract_embedded_cover(audio_abs_path: str) -> Optional[Tuple[bytes, str]]:
             mime = getattr(apic, "mime", None)
             data = getattr(apic, "data", None)
             if isinstance(data, (bytes, bytearray)):
-                return (bytes(data), _guess_ext_from_mime(mime))
+                return (bytes(data), mime)
 
     # FLAC pictures
     pictures = getattr(mf, "pictures", None)
@@ -54,33 +64,506 @@ def extract_embedded_cover(audio_abs_path: str) -> Optional[Tuple[bytes, str]]:
         data = getattr(pic, "data", None)
         mime = getattr(pic, "mime", None)
         if isinstance(data, (bytes, bytearray)):
-            return (bytes(data), _guess_ext_from_mime(mime))
+            return (bytes(data), mime)
 
     return None
 
 
-def ensure_cover_cached(
-    *,
-    data_dir: str,
-    track_id: str,
-    audio_abs_path: str,
-) -> Optional[str]:
-    covers_dir = os.path.join(data_dir, "covers")
-    _safe_mkdir(covers_dir)
+def extract_embedded_cover(audio_abs_path: str) -> Optional[Tuple[bytes, str]]:
+    try:
+        mf = MutagenFile(audio_abs_path)
+    except Exception:
+        return None
+    
+    if mf is None:
+        return None
+
+    picture = embedded_picture(mf)
+    if picture is None:
+        return None
+    data, mime = picture
+    return (data, _guess_ext_from_mime(mime))
+
+
+def cover_hash(data: bytes) -> str:
+    """Content hash naming a stored cover image."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def _syncsafe(b: bytes) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def locate_embedded_cover(audio_abs_path: str, data: bytes) -> Optional[int]:
+    """Byte offset of the picture bytes data inside the audio file.
+
+    For files whose picture is stored verbatim: the ID3v2 tag at the start
+    of an MP3 (not when unsynchronised) or the first FLAC PICTURE block.
+    None when it can't be found, in which case covers are extracted with
+    mutagen as before.
+    """
+    try:
+        with open(audio_abs_path, "rb") as f:
+            header = f.read(10)
+            id3_size = 0
+            if header[:3] == b"ID3" and len(header) == 10:
+                id3_size = 10 + _syncsafe(header[6:10]) + (10 if header[5] & 0x10 else 0)
+                f.seek(id3_size)
+                if f.read(4) != b"fLaC":
+                    # MP3: the picture is inside the tag.
+                    f.seek(0)
+                    pos = f.read(id3_size).find(data)
+                    return pos if pos >= 0 else None
+            elif header[:4] != b"fLaC":
+                return None
+            else:
+                f.seek(4)
+
+            # FLAC metadata blocks: 1 byte last-flag/type, 3 bytes length.
+            while True:
+                block = f.read(4)
+                if len(block) < 4:
+                    return None
+                block_type = block[0] & 0x7F
+                length = int.from_bytes(block[1:4], "big")
+                if block_type == 6:
+                    start = f.tell()
+                    mime_len = int.from_bytes(f.read(8)[4:8], "big")
+                    f.seek(mime_len, 1)
+                    desc_len = int.from_bytes(f.read(4), "big")
+                    f.seek(desc_len + 16, 1)
+                    data_len = int.from_bytes(f.read(4), "big")
+                    offset = f.tell()
+                    if data_len != len(data) or offset + data_len > start + length:
+                        return None
+                    return offset
+                if block[0] & 0x80:
+                    return None
+                f.seek(length, 1)
+    except OSError:
+        return None
+
+
+def read_embedded_cover(audio_abs_path: str, offset: int, size: int) -> Optional[bytes]:
+    """Picture bytes recorded by the scan, read straight from the audio file."""
+    try:
+        with open(audio_abs_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+    except OSError:
+        return None
+    return data if len(data) == size else None
+
+
+def store_cover(covers_dir: str, data: bytes, ext: str) -> str:
+    """Save image bytes under their content hash; returns the file name.
+
+    Identical images (e.g. the same embedded JPEG on every track of an
+    album) are stored once.
+    """
+    name = cover_hash(data) + ext
+    out_path = os.path.join(covers_dir, name)
+    if not os.path.exists(out_path):
+        _safe_mkdir(covers_dir)
+        _write_atomic(out_path, data)
+    return name
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Concurrent writers of the same content-addressed file just race to replace.
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
-    # Already cached? (any extension)
-    for ext in (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"):
-        candidate = os.path.join(covers_dir, f"{track_id}{ext}")
-        if os.path.exists(candidate):
-            return candidate
 
+def ensure_cover_cached(*, data_dir: str, audio_abs_path: str) -> Optional[str]:
+    """Extract the embedded cover into DATA_DIR/covers; returns its file name."""
     embedded = extract_embedded_cover(audio_abs_path)
     if embedded is None:
         return None
-
     data, ext = embedded
-    out_path = os.path.join(covers_dir, f"{track_id}{ext}")
-    with open(out_path, "wb") as f:
-        f.write(data)
+    return store_cover(os.path.join(data_dir, "covers"), data, ext)
+
+
+def _art_indexed(track: Track) -> bool:
+    # The scan recorded "no art", or art with its hash (so its image name).
+    return track.art_size == 0 or track.art_hash is not None
+
+
+MANIFEST_FILENAME = "manifest.jsonl"
+# Present once covers_dir holds content-addressed images only.
+LEGACY_SWEEP_MARKER = ".content-addressed"
+# Longest-side pixel sizes offered besides the original ("full").
+THUMBNAIL_SIZES = (64, 256)
+_COVER_EXTS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+COVER_NAME_RE = re.compile(r"^[0-9a-f]{40}\.(jpg|jpeg|png|webp|gif|bmp)$")
+
+
+class CoverResolver:
+    """Maps tracks to content-addressed cover images without repeating work.
+
+    Images live in DATA_DIR/covers named by the hash of their bytes, so they
+    never change and one album image is one file and one URL. The manifest
+    (DATA_DIR/covers/manifest.jsonl, one JSON object per line, appended as
+    covers are resolved) maps each track to its embedded image, or None for
+    "no embedded art", and each folder cover to its copy. Track entries are
+    stamped with the audio file's size and mtime from the library index, so
+    they are reused without touching the disk and go stale by themselves
+    when the file changes; folder entries are stamped with a stat of the
+    image.
+
+    Tracks scanned with their embedded art recorded (offset, size, MIME type
+    and hash; see library._extract_metadata) skip the manifest: the image
+    name is known up front, and a missing file is read straight from the
+    recorded offset instead of parsing the tags again.
+
+    Images cached per track before content addressing ({track id}.{ext}) are
+    dropped from the manifest, and deleted, the first time a writer loads it;
+    remove_legacy_files() deletes the ones no manifest ever listed.
+
+    Only a writer appends to and compacts the manifest. With a shared
+    library that is the scanning worker (see become_writer()); the others
+    keep what they resolve in memory and pick up its lines with refresh().
+
+    With memory_budget > 0, image bytes are also kept in a byte-bounded LRU.
+    """
+
+    def __init__(self, data_dir: str, memory_budget: int = 0, writer: bool = True) -> None:
+        self.covers_dir = os.path.join(data_dir, "covers")
+        self.manifest_path = os.path.join(self.covers_dir, MANIFEST_FILENAME)
+        self._lock = threading.Lock()
+        self._manifest: Dict[str, Tuple[Optional[int], Optional[float], Optional[str]]] = {}
+        self._images: LRUCache[Tuple[bytes, str]] = LRUCache(
+            maxsize=4096 if memory_budget > 0 else 0,
+            max_weight=memory_budget,
+            weigh=lambda item: len(item[0]),
+        )
+        # (image name, size) -> name of the file to serve at that size.
+        self._variants: LRUCache[str] = LRUCache(maxsize=16384)
+        # Image names on disk, listed on first use by is_resolved().
+        self._stored: Optional[Set[str]] = None
+        self.manifest_hits = 0
+        self.indexed_hits = 0
+        self.negative_hits = 0
+        self.extractions = 0
+        self.thumbnails_made = 0
+        self.writer = writer
+        # Manifest file read so far: (st_dev, st_ino), byte offset and lines.
+        self._manifest_file: Optional[Tuple[int, int]] = None
+        self._manifest_offset = 0
+        self._manifest_lines = 0
+        # Legacy image names found in the manifest, removed by the writer.
+        self._legacy: Set[str] = set()
+        with self._lock:
+            self._read_manifest()
+            if writer:
+                self._tidy_manifest_locked()
+
+    def _read_manifest(self) -> None:
+        # Applies the lines appended since the last call; a replaced
+        # (compacted) file is read again from the start. Holds self._lock.
+        try:
+            with open(self.manifest_path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if (st.st_dev, st.st_ino) != self._manifest_file or st.st_size < self._manifest_offset:
+                    self._manifest_file = (st.st_dev, st.st_ino)
+                    self._manifest_offset = 0
+                    self._manifest_lines = 0
+                f.seek(self._manifest_offset)
+                data = f.read()
+        except OSError:
+            return
+        # A line still being appended is read next time.
+        end = data.rfind(b"\n") + 1
+        self._manifest_offset += end
+        for line in data[:end].splitlines():
+            self._manifest_lines += 1
+            try:
+                entry = json.loads(line)
+                path = entry["path"]
+                if path is not None and (not COVER_NAME_RE.match(path) or path.split(".")[0] == entry["id"]):
+                    self._legacy.add(path)  # per-track file from before content addressing
+                    continue
+                self._manifest[entry["id"]] = (entry["size"], entry["mtime"], path)
+            except (ValueError, KeyError, TypeError):
+                continue  # torn line after a crash
+
+    def _tidy_manifest_locked(self, rewrite: bool = False) -> None:
+        legacy, self._legacy = self._legacy, set()
+        if legacy:
+            self._remove_legacy(legacy)
+        # Later lines supersede earlier ones; compact once it has grown (or
+        # legacy lines were dropped, so the cleanup runs once).
+        if rewrite or legacy or self._manifest_lines > 2 * len(self._manifest) + 1000:
+            self._rewrite_manifest()
+
+    def become_writer(self) -> None:
+        """Take over the manifest: append from now on, and tidy it up.
+
+        Called by the worker that takes over scans, once no other writes;
+        the in-memory entries it resolved as a follower are written too.
+        """
+        with self._lock:
+            self._read_manifest()
+            # A follower's own entries aren't on disk yet.
+            rewrite, self.writer = not self.writer, True
+            self._tidy_manifest_locked(rewrite)
+
+    def refresh(self) -> None:
+        """Pick up the manifest lines the writer appended since the last call."""
+        if self.writer:
+            return
+        with self._lock:
+            self._read_manifest()
+
+    def _remove_legacy(self, names: Set[str]) -> None:
+        referenced = {path for _, _, path in self._manifest.values()}
+        removed = 0
+        for name in names - referenced:
+            if not isinstance(name, str) or os.path.basename(name) != name:
+                continue
+            stem = name.split(".")[0]
+            thumbnails = [f"{stem}-{size}{ext}" for size in THUMBNAIL_SIZES for ext in (".webp", ".jpg")]
+            for candidate in [name, *thumbnails]:
+                try:
+                    os.remove(os.path.join(self.covers_dir, candidate))
+                    removed += 1
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Removed {removed} per-track cover files left from before content addressing")
+
+    def remove_legacy_files(self) -> None:
+        """Delete per-track images from before content addressing, once per covers_dir.
+
+        Their names look like content hashes (a track ID is 40 hex digits
+        too), so every image the manifest doesn't vouch for is hashed, and
+        kept only if its name is the hash of its bytes. Installs that
+        predate the manifest have nothing else in covers_dir, which makes
+        this one pass over the old files; the marker file skips it after.
+        """
+        marker = os.path.join(self.covers_dir, LEGACY_SWEEP_MARKER)
+        if os.path.exists(marker):
+            return
+        try:
+            names = os.listdir(self.covers_dir)
+        except OSError:
+            names = []
+        with self._lock:
+            referenced = {path for _, _, path in self._manifest.values()}
+        legacy: Set[str] = set()
+        for name in names:
+            if not COVER_NAME_RE.match(name) or name in referenced:
+                continue
+            try:
+                with open(os.path.join(self.covers_dir, name), "rb") as f:
+                    data = f.read()
+            except OSError:
+                continue
+            if cover_hash(data) != name.split(".")[0]:
+                legacy.add(name)
+        self._remove_legacy(legacy)
+        _safe_mkdir(self.covers_dir)
+        _write_atomic(marker, b"")
+
+    def _rewrite_manifest(self) -> None:
+        # Holds self._lock, so no line is appended meanwhile.
+        _safe_mkdir(self.covers_dir)
+        data = "".join(
+            json.dumps({"id": key, "size": size, "mtime": mtime, "path": path}) + "\n"
+            for key, (size, mtime, path) in self._manifest.items()
+        ).encode("utf-8")
+        _write_atomic(self.manifest_path, data)
+        st = os.stat(self.manifest_path)
+        self._manifest_file = (st.st_dev, st.st_ino)
+        self._manifest_offset = len(data)
+        self._manifest_lines = len(self._manifest)
+
+    def _record(self, key: str, size: Optional[int], mtime: Optional[float], path: Optional[str]) -> None:
+        with self._lock:
+            self._manifest[key] = (size, mtime, path)
+            if not self.writer:
+                return
+            _safe_mkdir(self.covers_dir)
+            with open(self.manifest_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"id": key, "size": size, "mtime": mtime, "path": path}) + "\n")
+
+    def _lookup(self, key: str, size: Optional[int], mtime: Optional[float]) -> Tuple[bool, Optional[str]]:
+        with self._lock:
+            entry = self._manifest.get(key)
+        if entry is None or entry[:2] != (size, mtime) or (entry[2] is not None and not self.exists(entry[2])):
+            return False, None
+        if entry[2] is None:
+            self.negative_hits += 1
+        else:
+            self.manifest_hits += 1
+        return True, entry[2]
+
+    def _remember(self, name: Optional[str]) -> Optional[str]:
+        if name is not None:
+            with self._lock:
+                if self._stored is not None:
+                    self._stored.add(name)
+        return name
+
+    def is_resolved(self, track: Track) -> bool:
+        """Whether track's cover is already known, without touching the disk."""
+        with self._lock:
+            if _art_indexed(track):
+                if track.art_size:
+                    if self._stored is None:
+                        try:
+                            self._stored = set(os.listdir(self.covers_dir))
+                        except OSError:
+                            self._stored = set()
+                    return track.art_hash + _guess_ext_from_mime(track.art_mime) in self._stored
+            else:
+                entry = self._manifest.get(track.id)
+                if entry is None or entry[:2] != (track.file_size, track.file_mtime):
+                    return False
+                if entry[2] is not None:
+                    return True
+            return track.cover_rel_path is None or "folder:" + track.cover_rel_path in self._manifest
+
+    def embedded_cover(self, track: Track, audio_abs_path: str) -> Optional[str]:
+        """Image name of track's embedded art, or None if it has none."""
+        if _art_indexed(track):
+            return self._indexed_cover(track, audio_abs_path)
+        found, name = self._lookup(track.id, track.file_size, track.file_mtime)
+        if found:
+            return name
+        self.extractions += 1
+        data = None
+        if track.art_offset is not None and track.art_size:
+            # Located by a header-only scan, but not hashed.
+            data = read_embedded_cover(audio_abs_path, track.art_offset, track.art_size)
+        if data is not None:
+            name = store_cover(self.covers_dir, data, _guess_ext_from_mime(track.art_mime))
+        else:
+            name = ensure_cover_cached(data_dir=os.path.dirname(self.covers_dir), audio_abs_path=audio_abs_path)
+        self._record(track.id, track.file_size, track.file_mtime, name)
+        return self._remember(name)
+
+    def _indexed_cover(self, track: Track, audio_abs_path: str) -> Optional[str]:
+        if not track.art_size:
+            self.negative_hits += 1
+            return None
+        ext = _guess_ext_from_mime(track.art_mime)
+        name = track.art_hash + ext
+        if self.exists(name):
+            self.indexed_hits += 1
+            return name
+        self.extractions += 1
+        data = None
+        if track.art_offset is not None:
+            data = read_embedded_cover(audio_abs_path, track.art_offset, track.art_size)
+        if data is None or cover_hash(data) != track.art_hash:
+            # Not stored verbatim, or the file changed since the scan.
+            return self._remember(ensure_cover_cached(data_dir=os.path.dirname(self.covers_dir), audio_abs_path=audio_abs_path))
+        return self._remember(store_cover(self.covers_dir, data, ext))
+
+    def folder_cover(self, cover_rel_path: str, cover_abs_path: str) -> Optional[str]:
+        """Image name of a folder cover file, or None if it is missing."""
+        try:
+            st = os.stat(cover_abs_path)
+        except OSError:
+            return None
+        key = "folder:" + cover_rel_path
+        found, name = self._lookup(key, st.st_size, st.st_mtime)
+        if found:
+            return name
+        try:
+            with open(cover_abs_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        ext = os.path.splitext(cover_abs_path)[1].lower()
+        name = self._remember(store_cover(self.covers_dir, data, ext if ext in _COVER_EXTS else ".jpg"))
+        self._record(key, st.st_size, st.st_mtime, name)
+        return name
+
+    def cover_for(self, track: Track, audio_abs_path: str, folder_cover_abs_path: Optional[str]) -> Optional[str]:
+        """Image name for track: embedded art first, then the folder cover."""
+        name = self.embedded_cover(track, audio_abs_path)
+        if name is None and track.cover_rel_path is not None and folder_cover_abs_path is not None:
+            name = self.folder_cover(track.cover_rel_path, folder_cover_abs_path)
+        return name
+
+    def path(self, name: str) -> Optional[str]:
+        """Absolute path of a stored image; None for names that aren't ours."""
+        if not COVER_NAME_RE.match(name):
+            return None
+        return os.path.join(self.covers_dir, name)
+
+    def variant(self, name: str, size: Optional[int]) -> str:
+        """File name to serve for image name scaled to fit size x size pixels.
+
+        Thumbnails are made on first request and stored next to the original
+        as {hash}-{size}.webp (or .jpg without WebP support). The original is
+        served instead when it is already that small, when it can't be
+        decoded, or when Pillow isn't installed.
+        """
+        if size is None or Image is None:
+            return name
+        key = (name, size)
+        variant = self._variants.get(key)
+        if variant is not None:
+            return variant
+        fmt, ext = ("WEBP", ".webp") if features.check("webp") else ("JPEG", ".jpg")
+        variant = f"{name.split('.')[0]}-{size}{ext}"
+        out_path = os.path.join(self.covers_dir, variant)
+        if not os.path.exists(out_path) and not self._make_thumbnail(os.path.join(self.covers_dir, name), out_path, size, fmt):
+            variant = name
+        self._variants.put(key, variant)
+        return variant
+
+    def _make_thumbnail(self, src_path: str, out_path: str, size: int, fmt: str) -> bool:
+        try:
+            with Image.open(src_path) as img:
+                if max(img.size) <= size:
+                    return False
+                img.draft("RGB", (size, size))  # JPEG: decode at reduced scale
+                img.thumbnail((size, size), Image.LANCZOS)
+                has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+                buf = io.BytesIO()
+                img.convert("RGBA" if has_alpha and fmt == "WEBP" else "RGB").save(buf, fmt, quality=80)
+        except Exception:
+            return False
+        _write_atomic(out_path, buf.getvalue())
+        self.thumbnails_made += 1
+        return True
+
+    def exists(self, name: str) -> bool:
+        return name in self._images or os.path.exists(os.path.join(self.covers_dir, name))
+
+    def read(self, name: str) -> Optional[Tuple[bytes, str]]:
+        """(bytes, media type) of a stored file from memory, loading it on a miss.
+
+        None when the memory cache is disabled or the image is missing.
+        """
+        if self._images.maxsize <= 0:
+            return None
+        item = self._images.get(name)
+        if item is None:
+            try:
+                with open(os.path.join(self.covers_dir, name), "rb") as f:
+                    data = f.read()
+            except OSError:
+                return None
+            item = (data, mimetypes.guess_type(name)[0] or "application/octet-stream")
+            self._images.put(name, item)
+        return item
 
-    return out_path
+    def stats(self) -> dict:
+        with self._lock:
+            manifest_size = len(self._manifest)
+        return {
+            "manifest_entries": manifest_size,
+            "manifest_hits": self.manifest_hits,
+            "indexed_hits": self.indexed_hits,
+            "negative_hits": self.negative_hits,
+            "extractions": self.extractions,
+            "thumbnails_made": self.thumbnails_made,
+            "memory": self._images.stats(),
+        }
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, List, Optional, Tuple
+
+import anyio
+
+
+# (event id, event name, JSON data)
+Event = Tuple[int, str, str]
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int) -> None:
+        self.loop = loop
+        self.queue: "asyncio.Queue[Event]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, event: Event) -> None:
+        # Runs on the subscriber's event loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class EventBroadcaster:
+    """Fans out small state-change events to Server-Sent Events clients.
+
+    publish() may be called from any thread. Every event gets the next id
+    from one counter, and the last `history` events are kept so a client
+    reconnecting with Last-Event-ID gets just what it missed. A client too
+    far behind (or too slow to drain its queue) gets a full snapshot instead.
+    snapshot() may block (the player's locks), so it runs in a worker thread.
+    """
+
+    def __init__(self, snapshot: Callable[[], dict], history: int = 256, queue_size: int = 256) -> None:
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._version = 0
+        self._history: Deque[Event] = deque(maxlen=history)
+        self._subscribers: List[_Subscriber] = []
+        self._queue_size = queue_size
+
+    @property
+    def version(self) -> int:
+        with self._lock:
+            return self._version
+
+    def publish(self, name: str, data: dict) -> None:
+        with self._lock:
+            self._version += 1
+            event = (self._version, name, json.dumps(data, separators=(",", ":")))
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, event)
+            except RuntimeError:
+                pass  # loop closed; the subscriber is going away
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _missed_since(self, last_id: Optional[int]) -> Optional[List[Event]]:
+        # Caller holds the lock. None means "can't replay, send a snapshot".
+        if last_id is None or last_id > self._version:
+            return None
+        if last_id == self._version:
+            return []
+        if not self._history or self._history[0][0] > last_id + 1:
+            return None
+        return [event for event in self._history if event[0] > last_id]
+
+    async def _snapshot_event(self) -> Event:
+        with self._lock:
+            version = self._version
+        snapshot = await anyio.to_thread.run_sync(self._snapshot)
+        return (version, "state", json.dumps(snapshot, separators=(",", ":")))
+
+    async def stream(
+        self,
+        last_event_id: Optional[int],
+        is_disconnected: Callable[[], "asyncio.Future[bool]"],
+        heartbeat: float = 15.0,
+    ) -> AsyncIterator[str]:
+        """SSE body for one client, starting after last_event_id."""
+        sub = _Subscriber(asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            missed = self._missed_since(last_event_id)
+            self._subscribers.append(sub)
+        try:
+            yield "retry: 3000\n\n"
+            for event in missed if missed is not None else [await self._snapshot_event()]:
+                yield _format(event)
+            while True:
+                if sub.overflowed:
+                    sub.overflowed = False
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    yield _format(await self._snapshot_event())
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _format(event)
+        finally:
+            with self._lock:
+                self._subscribers.remove(sub)
+
+
+def _format(event: Event) -> str:
+    event_id, name, data = event
+    return f"id: {event_id}\nevent: {name}\ndata: {data}\n\n"
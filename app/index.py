@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import marshal
+import operator
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from .library import ScanResult
+from .models import FolderEntry
+from .store import TrackStore
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_FILENAME = "library.idx"
+
+# Columns follow the TrackStore buffers and the FolderEntry dataclass, so
+# changing either changes the signature and a snapshot written by an older
+# version is simply ignored (and rebuilt by the next scan). marshal's format
+# and array byte order are tied to the interpreter and machine, which are part
+# of the signature too.
+_STORE_COLUMNS = [f"{name}:{typecode or 'bytes'}" for name, typecode in TrackStore.COLUMNS.items()]
+_FOLDER_COLUMNS = [f.name for f in dataclasses.fields(FolderEntry)]
+_folder_row = operator.attrgetter(*_FOLDER_COLUMNS)
+_SIGNATURE = (
+    f"py{sys.version_info[0]}.{sys.version_info[1]}-{sys.byteorder}:"
+    + ",".join(_STORE_COLUMNS)
+    + ";"
+    + ",".join(_FOLDER_COLUMNS)
+)
+
+
+def _to_columns(rows: List[tuple], width: int) -> List[list]:
+    if not rows:
+        return [[] for _ in range(width)]
+    return [list(col) for col in zip(*rows)]
+
+
+class LibraryIndex:
+    """Persistent snapshot of the scanned library under DATA_DIR.
+
+    The track store's buffers are written as they are and folder listings
+    column-wise, all with marshal, so loading is little more than reading the
+    file. Saves go to a temporary file that is renamed over the old one, so a
+    crash mid-save keeps the previous snapshot.
+    """
+
+    def __init__(self, data_dir: str) -> None:
+        self.path = os.path.join(data_dir, INDEX_FILENAME)
+
+    def load(self, music_dir: str) -> Optional[ScanResult]:
+        if not os.path.exists(self.path):
+            return None
+
+        start = time.time()
+        try:
+            with open(self.path, "rb") as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f"Could not read library index {self.path}: {e}")
+            return None
+
+        if not isinstance(data, dict) or data.get("signature") != _SIGNATURE:
+            logger.info("Library index was written by a different version, ignoring it")
+            return None
+        if data.get("music_dir") != os.path.abspath(music_dir):
+            logger.info("Library index belongs to a different MUSIC_DIR, ignoring it")
+            return None
+
+        tracks = TrackStore.from_buffers(data["tracks"])
+
+        folders: Dict[str, FolderEntry] = {}
+        for row in zip(*data["folders"]):
+            folder = FolderEntry(*row)
+            folders[folder.rel_path] = folder
+
+        logger.info(f"Loaded {len(tracks)} tracks from library index in {time.time() - start:.3f}s")
+        return ScanResult(tracks, folders)
+
+    def save(self, music_dir: str, result: ScanResult) -> None:
+        start = time.time()
+        folder_rows = [_folder_row(folder) for folder in result.folders.values()]
+        data = {
+            "signature": _SIGNATURE,
+            "music_dir": os.path.abspath(music_dir),
+            "saved_at": time.time(),
+            "tracks": result.tracks.to_buffers(),
+            "folders": _to_columns(folder_rows, len(_FOLDER_COLUMNS)),
+        }
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{INDEX_FILENAME}.", suffix=".tmp", dir=os.path.dirname(self.path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.info(f"Saved {len(result.tracks)} tracks to library index in {time.time() - start:.3f}s")
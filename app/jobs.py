@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from .library import ScanCancelled, ScanProgress
+from .models import LibraryDiff
+
+
+logger = logging.getLogger(__name__)
+
+
+class RescanJob:
+    """The library rescan running in the background, one at a time.
+
+    start() launches run(full, progress) on its own thread and returns at
+    once; calling it while a scan is running joins that scan instead of
+    queueing another, except that a full scan asked for during an
+    incremental one is queued to run after it. status() reports the counts from the scan's progress
+    callback, throughput and an ETA (from the previous library's folder
+    count, so none for a first scan). cancel() makes the next progress
+    callback raise ScanCancelled (and drops a queued full scan); run() is
+    expected to publish nothing in that case, so the previous library keeps
+    being served.
+    """
+
+    def __init__(self, run: Callable[[bool, Callable[[ScanProgress], None]], LibraryDiff]) -> None:
+        self._run = run
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._cancel = threading.Event()
+        self._id = 0
+        self._state = "idle"  # running, cancelling, done, cancelled or failed
+        self._full = False
+        self._queued_full = False  # a full scan to run when this one ends
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._started: Optional[float] = None  # monotonic
+        self._elapsed = 0.0
+        self._progress = ScanProgress(0, 0, 0, 0)
+        self._result: Optional[dict] = None
+        self._error: Optional[str] = None
+
+    def start(self, full: bool = False) -> Tuple[dict, bool]:
+        """Start a scan, or join the running one. Returns (status, joined)."""
+        with self._lock:
+            if self._thread is not None:
+                if full and not self._full:
+                    # The running scan trusts unchanged folders; a full one
+                    # must still re-check every file.
+                    self._queued_full = True
+                return self._status_locked(), True
+            self._start_locked(full)
+            return self._status_locked(), False
+
+    def _start_locked(self, full: bool) -> None:
+        self._id += 1
+        self._state = "running"
+        self._full = full
+        self._started_at = time.time()
+        self._finished_at = None
+        self._started = time.monotonic()
+        self._elapsed = 0.0
+        self._progress = ScanProgress(0, 0, 0, 0)
+        self._result = None
+        self._error = None
+        self._cancel.clear()
+        self._thread = threading.Thread(target=self._main, args=(full,), name="library-scan", daemon=True)
+        self._thread.start()
+
+    def cancel(self) -> bool:
+        """Ask the running scan to stop; False if there is none."""
+        with self._lock:
+            if self._thread is None:
+                return False
+            self._state = "cancelling"
+            self._queued_full = False
+            self._cancel.set()
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> dict:
+        """Wait for the running scan, and a full scan queued behind it, to end."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                thread = self._thread
+            if thread is None:
+                break
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                break
+        return self.status()
+
+    def status(self) -> dict:
+        with self._lock:
+            return self._status_locked()
+
+    def _status_locked(self) -> dict:
+        elapsed = time.monotonic() - self._started if self._thread is not None else self._elapsed
+        p = self._progress
+        eta = None
+        if self._thread is not None and p.expected_folders and p.folders:
+            eta = max(0.0, elapsed * (p.expected_folders - p.folders) / p.folders)
+        return {
+            "id": self._id,
+            "state": self._state,
+            "full": self._full,
+            "queued_full": self._queued_full,
+            "started_at": self._started_at,
+            "finished_at": self._finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "folders": p.folders,
+            "expected_folders": p.expected_folders or None,
+            "tracks": p.tracks,
+            "parsed": p.parsed,
+            "folders_per_second": round(p.folders / elapsed, 1) if elapsed > 0 else None,
+            "tracks_per_second": round(p.tracks / elapsed, 1) if elapsed > 0 else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+            "result": self._result,
+            "error": self._error,
+        }
+
+    def _on_progress(self, progress: ScanProgress) -> None:
+        if self._cancel.is_set():
+            raise ScanCancelled()
+        with self._lock:
+            self._progress = progress
+
+    def _main(self, full: bool) -> None:
+        state, result, error = "done", None, None
+        try:
+            diff = self._run(full, self._on_progress)
+            result = {"added": len(diff.added), "removed": len(diff.removed), "changed": len(diff.changed)}
+        except ScanCancelled:
+            state = "cancelled"
+            logger.info("Library rescan cancelled")
+        except Exception as e:
+            state, error = "failed", str(e)
+            logger.exception("Library rescan failed")
+        with self._lock:
+            self._state = state
+            self._result = result
+            self._error = error
+            self._finished_at = time.time()
+            self._elapsed = time.monotonic() - self._started
+            self._thread = None
+            if self._queued_full:
+                self._queued_full = False
+                self._start_locked(True)
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import dataclasses
 import hashlib
 import logging
+import multiprocessing
 import os
-from typing import Dict, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import AbstractSet, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import mutagen
 
-from .models import Track
+from .birthtime import BirthTimeProvider, get_birthtime_provider
+from .covers import cover_hash, embedded_picture, locate_embedded_cover
+from .models import FolderEntry, LibraryDiff, Track
+from .store import TrackStore, TrackStoreBuilder
+from .tags import read_header_tags
 
 
 logger = logging.getLogger(__name__)
@@ -18,15 +27,20 @@ IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
 PREFERRED_COVER_BASENAMES = {"cover", "folder", "front"}
 
 
+def _track_digest(rel_path: str) -> bytes:
+    return hashlib.sha1(rel_path.encode("utf-8")).digest()
+
+
 def _track_id(rel_path: str) -> str:
-    return hashlib.sha1(rel_path.encode("utf-8")).hexdigest()
+    return _track_digest(rel_path).hex()
 
 
-def _find_folder_cover(abs_folder: str) -> Optional[str]:
-    try:
-        entries = os.listdir(abs_folder)
-    except OSError:
-        return None
+def _find_folder_cover(abs_folder: str, entries: Optional[List[str]] = None) -> Optional[str]:
+    if entries is None:
+        try:
+            entries = os.listdir(abs_folder)
+        except OSError:
+            return None
 
     lowered = {e.lower(): e for e in entries}
 
@@ -43,127 +57,536 @@ def _find_folder_cover(abs_folder: str) -> Optional[str]:
     return None
 
 
-def _extract_metadata(abs_path: str, filename: str) -> tuple[Optional[str], Optional[str], Optional[str], Optional[float], Optional[int]]:
+# Tag names for one mutagen.File(easy=False) parse: ID3 frames, Vorbis comments.
+_TAG_KEYS = {
+    "artist": ("TPE1", "artist"),
+    "album": ("TALB", "album"),
+    "title": ("TIT2", "title"),
+    "tracknumber": ("TRCK", "tracknumber"),
+}
+
+# (offset, size, mime, hash) of embedded art; size 0 = none, None = unknown.
+ArtInfo = Tuple[Optional[int], Optional[int], Optional[str], Optional[str]]
+_NO_ART: ArtInfo = (None, 0, None, None)
+_UNKNOWN_ART: ArtInfo = (None, None, None, None)
+
+
+def _tag(tags, name: str) -> Optional[str]:
+    id3_key, vorbis_key = _TAG_KEYS[name]
+    try:
+        if hasattr(tags, "getall"):
+            frame = tags.get(id3_key)
+            values = frame.text if frame is not None else None
+        else:
+            values = tags.get(vorbis_key)
+    except (KeyError, ValueError, AttributeError):
+        return None
+    if not values:
+        return None
+    return str(values[0])
+
+
+def _track_number(track_str: Optional[str]) -> Optional[int]:
+    if track_str:
+        # Handle formats like "1/10" or just "1"
+        try:
+            return int(track_str.split('/')[0])
+        except (ValueError, AttributeError):
+            pass
+    return None
+
+
+def _extract_metadata(abs_path: str, filename: str) -> tuple[Optional[str], Optional[str], Optional[str], Optional[float], Optional[int], ArtInfo]:
     """Extract metadata from audio file using mutagen.
-    Returns: (artist, album, title, duration, track_number)
+    Returns: (artist, album, title, duration, track_number, art)
+
+    One full parse (not easy=True) reads the text tags and the embedded
+    cover together; art records where the cover's bytes are so they can be
+    served later without parsing the file again.
     """
     try:
-        audio = mutagen.File(abs_path, easy=True)
+        audio = mutagen.File(abs_path)
         if audio is None:
-            return None, None, None, None, None
+            return None, None, None, None, None, _UNKNOWN_ART
         
         # Get basic metadata
-        artist = audio.get('artist', [None])[0] if 'artist' in audio else None
-        album = audio.get('album', [None])[0] if 'album' in audio else None
-        title = audio.get('title', [None])[0] if 'title' in audio else None
+        tags = audio.tags
+        artist = _tag(tags, "artist") if tags is not None else None
+        album = _tag(tags, "album") if tags is not None else None
+        title = _tag(tags, "title") if tags is not None else None
         
         # Get duration
         duration = audio.info.length if hasattr(audio, 'info') and hasattr(audio.info, 'length') else None
         
         # Get track number
-        track_num = None
-        if 'tracknumber' in audio:
-            track_str = audio['tracknumber'][0]
-            if track_str:
-                # Handle formats like "1/10" or just "1"
-                try:
-                    track_num = int(track_str.split('/')[0])
-                except (ValueError, AttributeError):
-                    pass
+        track_num = _track_number(_tag(tags, "tracknumber") if tags is not None else None)
+        
+        art = _NO_ART
+        picture = embedded_picture(audio)
+        if picture is not None:
+            data, mime = picture
+            art = (locate_embedded_cover(abs_path, data), len(data), mime, cover_hash(data))
         
-        return artist, album, title, duration, track_num
+        return artist, album, title, duration, track_num, art
     except Exception as e:
         logger.debug(f"Failed to extract metadata from {filename}: {e}")
-        return None, None, None, None, None
+        return None, None, None, None, None, _UNKNOWN_ART
 
 
-def scan_library(music_dir: str) -> Tuple[Dict[str, Track], List[str]]:
-    tracks: Dict[str, Track] = {}
-    order: List[str] = []
+def _extract_metadata_partial(abs_path: str, filename: str) -> tuple[Optional[str], Optional[str], Optional[str], Optional[float], Optional[int], ArtInfo]:
+    """_extract_metadata reading only the header region (see tags.read_header_tags).
 
-    music_dir = os.path.abspath(music_dir)
-    logger.info(f"Scanning: {music_dir}")
+    Picture bytes are never read, so art has no hash; files the partial
+    reader doesn't handle go through mutagen.
+    """
+    header = read_header_tags(abs_path)
+    if header is None:
+        return _extract_metadata(abs_path, filename)
+    tags = header.tags
+    art = (header.art_offset, header.art_size, header.art_mime, None) if header.art_size else _NO_ART
+    return tags.get("artist"), tags.get("album"), tags.get("title"), header.length, _track_number(tags.get("tracknumber")), art
+
+
+# How tags are read during scans: a full mutagen parse, or header-only reads.
+TAG_READERS = {"mutagen": _extract_metadata, "partial": _extract_metadata_partial}
+SCAN_EXECUTORS = ("thread", "process")
+
+
+class _ParseJob(NamedTuple):
+    tid: str
+    rel_path: str
+    filename: str
+    folder: FolderEntry
+    file_size: Optional[int]
+    file_mtime: Optional[float]
+    file_inode: Optional[int]
+    prev: Optional[Track]
+
+
+class _Rows(NamedTuple):
+    """Rows [start, stop) of the previous store, carried over unchanged."""
+    start: int
+    stop: int
+
+
+def _make_executor(workers: int, executor: str) -> Optional[Executor]:
+    if workers <= 0:
+        return None
+    if executor == "process":
+        # spawn rather than fork: the server process is multi-threaded.
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    if executor == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    raise ValueError(f"Invalid scan executor: {executor}")
+
+
+@dataclass
+class ScanResult:
+    # Iteration order is library order: folders depth-first, files sorted.
+    tracks: TrackStore
+    folders: Dict[str, FolderEntry]
+    diff: LibraryDiff = field(default_factory=LibraryDiff)
+
+
+class ScanProgress(NamedTuple):
+    """Counts so far, passed to scan_library's progress callback after each folder."""
+    folders: int  # folders visited, listed or reused
+    tracks: int  # tracks committed to the new table
+    parsed: int  # files whose tags were (or are being) read
+    expected_folders: int  # folders in the previous result; 0 if there is none
+
+
+class ScanCancelled(Exception):
+    """Raised by a progress callback to abandon the scan."""
+
+
+@dataclass(frozen=True)
+class LibrarySnapshot:
+    """One published version of the library.
+
+    Nothing in it changes once built: a scan builds a new snapshot and the
+    server swaps its single reference to it, so readers take the reference
+    once and use tracks, folders and version together without a lock.
+    build() warms the store's derived indexes (see TrackStore.warm()), so no
+    reader pays for them.
+    """
+    tracks: TrackStore
+    folders: Dict[str, FolderEntry]
+    # Bumped whenever the tracks change content; reported with library events.
+    version: int
+
+    @classmethod
+    def empty(cls) -> "LibrarySnapshot":
+        return cls(TrackStore.empty(), {}, 0)
+
+    @classmethod
+    def build(
+        cls,
+        tracks: TrackStore,
+        folders: Dict[str, FolderEntry],
+        version: int,
+        on_json_index: Optional[Callable[["LibrarySnapshot"], None]] = None,
+    ) -> "LibrarySnapshot":
+        """Snapshot of tracks; on_json_index(snapshot) runs on a background
+        thread once the store's JSON index is built."""
+        snapshot = cls(tracks, folders, version)
+        tracks.warm(None if on_json_index is None else lambda _: on_json_index(snapshot))
+        return snapshot
+
+
+class _Scanner:
+    """Walks music_dir folder by folder, reusing whatever the previous scan recorded.
 
-    folder_count = 0
-    for root, _, files in os.walk(music_dir):
-        audio_files = [f for f in files if os.path.splitext(f)[1].lower() in AUDIO_EXTS]
-        if not audio_files:
-            continue
+    A folder whose mtime matches the previous scan has the same entries, so
+    its listing, cover and tracks are taken from the previous result without
+    touching the files; only its subfolders are visited. Files in changed
+    folders are stat'ed and parsed again only when (size, mtime, inode)
+    differ. With full=True every folder is re-listed and every file re-stat'ed,
+    which also catches tags rewritten in place (those don't touch the
+    folder's mtime).
 
-        folder_count += 1
-        folder_rel = os.path.relpath(root, music_dir)
-        logger.info(f"  Folder {folder_count}: {folder_rel} ({len(audio_files)} audio files)")
+    When changed_folders is given (the watcher knows exactly what moved),
+    every other folder already in previous is trusted without even a stat;
+    the listed folders, and any folder not seen before, are re-listed.
 
-        # Get folder modification time (mtime)
-        folder_mtime = None
+    With a pool, tag parsing runs on the workers while the walk carries on.
+    Results are committed strictly in walk order through a bounded window of
+    in-flight jobs, so the output is identical to the serial scan.
+
+    Unchanged tracks are never turned back into Track objects: their rows
+    are copied from the previous store column by column (a whole folder at
+    a time when it is reused), and when nothing changed at all the previous
+    store itself is returned.
+    """
+
+    def __init__(
+        self,
+        music_dir: str,
+        previous: Optional[ScanResult],
+        full: bool,
+        pool: Optional[Executor] = None,
+        max_inflight: int = 0,
+        birthtime: Optional[BirthTimeProvider] = None,
+        changed_folders: Optional[AbstractSet[str]] = None,
+        extract: Callable[[str, str], tuple] = _extract_metadata,
+        progress: Optional[Callable[[ScanProgress], None]] = None,
+    ) -> None:
+        self.music_dir = music_dir
+        self.progress = progress
+        self.extract = extract
+        self.birthtime = birthtime or get_birthtime_provider(music_dir)
+        self.prev_store: TrackStore = previous.tracks if previous is not None else TrackStore.empty()
+        self.prev_folders: Dict[str, FolderEntry] = previous.folders if previous is not None else {}
+        self.full = full
+        self.changed_folders = changed_folders
+        self.builder = TrackStoreBuilder()
+        # Rows of the previous store that made it into the new one.
+        self._kept = bytearray(len(self.prev_store))
+        self.folders: Dict[str, FolderEntry] = {}
+        self.audio_folder_count = 0
+        self.listed_count = 0
+        self.parsed_count = 0
+        self.pool = pool
+        self.max_inflight = max_inflight
+        self._window: Deque[Tuple[Union[Track, _ParseJob, _Rows], Optional[Future], bool]] = deque()
+        self._inflight = 0
+        self._diff = LibraryDiff()
+
+    def run(self) -> ScanResult:
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            entry = self._scan_folder(rel_dir)
+            if self.progress is not None:
+                self.progress(ScanProgress(len(self.folders), len(self.builder), self.parsed_count, len(self.prev_folders)))
+            if entry is None:
+                continue
+            # Reverse so folders are visited in sorted, depth-first order.
+            for name in reversed(entry.subdirs):
+                stack.append(os.path.join(rel_dir, name) if rel_dir else name)
+        self._drain(-1)
+        removed = []
+        row = self._kept.find(0)
+        while row != -1:
+            removed.append(self.prev_store.id_at(row))
+            row = self._kept.find(0, row + 1)
+        self._diff.removed = removed
+        if self._diff.is_empty() and self.builder.copies(self.prev_store):
+            # Nothing changed: keep the previous store and the indexes built on it.
+            return ScanResult(self.prev_store, self.folders, self._diff)
+        return ScanResult(self.builder.build(), self.folders, self._diff)
+
+    def _scan_folder(self, rel_dir: str) -> Optional[FolderEntry]:
+        prev = self.prev_folders.get(rel_dir)
+        if self.changed_folders is not None:
+            if prev is not None and rel_dir not in self.changed_folders:
+                return self._reuse_folder(prev)
+
+        abs_dir = os.path.join(self.music_dir, rel_dir) if rel_dir else self.music_dir
         try:
-            folder_mtime = os.path.getmtime(root)
+            dir_mtime: Optional[float] = os.stat(abs_dir).st_mtime
         except OSError:
-            pass
-        
-        # Try to get folder creation time (birth time) if available
-        folder_btime = None
+            return None
+
+        if (
+            not self.full
+            and self.changed_folders is None
+            and prev is not None
+            and prev.mtime == dir_mtime
+        ):
+            return self._reuse_folder(prev)
+
         try:
-            # Use stat to get birth time
-            import subprocess
-            result = subprocess.run(['stat', '-c', '%W', root], 
-                                  capture_output=True, text=True)
-            if result.returncode == 0:
-                btime_str = result.stdout.strip()
-                if btime_str and btime_str != '0':
-                    folder_btime = float(btime_str)
-        except (OSError, ValueError, ImportError):
-            pass
-        
-        # If no modification time, try to get newest file modification time
-        if folder_mtime is None:
-            newest_mtime = None
-            for fn in audio_files:
-                abs_path = os.path.join(root, fn)
-                try:
-                    file_mtime = os.path.getmtime(abs_path)
-                    if newest_mtime is None or file_mtime > newest_mtime:
-                        newest_mtime = file_mtime
-                except OSError:
-                    pass
-            folder_mtime = newest_mtime
-
-        folder_cover = _find_folder_cover(root)
-        for fn in sorted(audio_files):
-            abs_path = os.path.join(root, fn)
-            rel_path = os.path.relpath(abs_path, music_dir)
-            tid = _track_id(rel_path)
-
-            ext = os.path.splitext(fn)[1].lower().lstrip(".")
-            cover_rel = None
+            with os.scandir(abs_dir) as it:
+                dir_entries = list(it)
+        except OSError:
+            return None
+        self.listed_count += 1
+
+        subdirs: List[str] = []
+        files: List[str] = []
+        for de in dir_entries:
+            try:
+                if de.is_dir():
+                    # Like os.walk, don't descend into symlinked directories.
+                    if not de.is_symlink():
+                        subdirs.append(de.name)
+                    continue
+            except OSError:
+                pass
+            files.append(de.name)
+
+        audio_files = sorted(f for f in files if os.path.splitext(f)[1].lower() in AUDIO_EXTS)
+        cover_rel = None
+        btime = None
+        if audio_files:
+            self.audio_folder_count += 1
+            logger.info(f"  Folder {self.audio_folder_count}: {rel_dir or '.'} ({len(audio_files)} audio files)")
+            folder_cover = _find_folder_cover(abs_dir, files)
             if folder_cover is not None:
-                cover_rel = os.path.relpath(folder_cover, music_dir)
-            
-            # Extract metadata
-            artist, album, title, duration, track_number = _extract_metadata(abs_path, fn)
-            
-            # If title is not available, use filename without extension
-            if not title:
-                title = os.path.splitext(fn)[0]
-
-            track = Track(
-                id=tid,
-                rel_path=rel_path,
-                filename=fn,
-                folder=folder_rel if folder_rel != "." else "",
-                ext=ext,
-                cover_rel_path=cover_rel,
-                artist=artist,
-                album=album,
-                title=title,
-                duration=duration,
-                track_number=track_number,
-                folder_mtime=folder_mtime,
-                folder_btime=folder_btime,
+                cover_rel = os.path.relpath(folder_cover, self.music_dir)
+            btime = self.birthtime(abs_dir)
+
+        entry = FolderEntry(
+            rel_path=rel_dir,
+            mtime=dir_mtime,
+            btime=btime,
+            cover_rel_path=cover_rel,
+            subdirs=tuple(sorted(subdirs)),
+            audio_files=tuple(audio_files),
+        )
+        self.folders[rel_dir] = entry
+        for fn in audio_files:
+            self._add_track(entry, fn, stat_file=True)
+        return entry
+
+    def _reuse_folder(self, prev: FolderEntry) -> FolderEntry:
+        self.folders[prev.rel_path] = prev
+        if prev.audio_files:
+            self.audio_folder_count += 1
+            logger.debug(f"  Folder unchanged: {prev.rel_path or '.'} ({len(prev.audio_files)} audio files)")
+            rows = self._stored_rows(prev)
+            if rows is not None:
+                self._emit(_Rows(rows.start, rows.stop))
+            else:
+                for fn in prev.audio_files:
+                    self._add_track(prev, fn, stat_file=False)
+        return prev
+
+    def _stored_rows(self, folder: FolderEntry) -> Optional[range]:
+        """Rows of the previous store holding exactly folder's audio files, in order."""
+        f = self.prev_store.folder_index(folder.rel_path)
+        if f < 0:
+            return None
+        rows = self.prev_store.folder_rows(f)
+        if len(rows) != len(folder.audio_files):
+            return None
+        rel = folder.rel_path
+        expected = b"".join(_track_digest(os.path.join(rel, fn) if rel else fn) for fn in folder.audio_files)
+        return rows if self.prev_store.id_bytes(rows.start, rows.stop) == expected else None
+
+    def _add_track(self, folder: FolderEntry, fn: str, stat_file: bool) -> None:
+        rel_path = os.path.join(folder.rel_path, fn) if folder.rel_path else fn
+        tid = _track_id(rel_path)
+        row = self.prev_store.index_of(tid)
+
+        if not stat_file and row >= 0:
+            self._emit(_Rows(row, row + 1))
+            return
+        prev = self.prev_store.track(row) if row >= 0 else None
+
+        abs_path = os.path.join(self.music_dir, rel_path)
+        file_size = None
+        file_mtime = None
+        file_inode = None
+        try:
+            st = os.stat(abs_path)
+            file_size = st.st_size
+            file_mtime = st.st_mtime
+            file_inode = st.st_ino
+        except OSError:
+            pass
+
+        if (
+            prev is not None
+            and file_size is not None
+            and (prev.file_size, prev.file_mtime, prev.file_inode) == (file_size, file_mtime, file_inode)
+        ):
+            # Unchanged file: keep the stored tags, refresh folder-level data.
+            if (prev.cover_rel_path, prev.folder_mtime, prev.folder_btime) == (folder.cover_rel_path, folder.mtime, folder.btime):
+                self._emit(_Rows(row, row + 1))
+                return
+            track = dataclasses.replace(
+                prev,
+                cover_rel_path=folder.cover_rel_path,
+                folder_mtime=folder.mtime,
+                folder_btime=folder.btime,
             )
-            tracks[tid] = track
-            order.append(tid)
-            logger.debug(f"    - {fn} (id: {tid[:8]}...)")
+            self._emit(track, changed=True)
+            return
+
+        self.parsed_count += 1
+        self._emit(_ParseJob(tid, rel_path, fn, folder, file_size, file_mtime, file_inode, prev))
+
+    def _emit(self, item: Union[Track, _ParseJob, _Rows], changed: bool = False) -> None:
+        if self.pool is None:
+            if isinstance(item, _ParseJob):
+                item = self._build_track(item, self.extract(os.path.join(self.music_dir, item.rel_path), item.filename))
+            self._commit(item, changed)
+            return
+
+        future = None
+        if isinstance(item, _ParseJob):
+            future = self.pool.submit(self.extract, os.path.join(self.music_dir, item.rel_path), item.filename)
+            self._inflight += 1
+        self._window.append((item, future, changed))
+        self._drain(self.max_inflight)
+
+    def _drain(self, limit: int) -> None:
+        """Commit finished work from the head of the window, in walk order.
+
+        Blocks on the oldest job while more than limit jobs are in flight
+        (limit=-1 flushes everything).
+        """
+        while self._window:
+            item, future, changed = self._window[0]
+            if future is not None and self._inflight <= limit and not future.done():
+                return
+            self._window.popleft()
+            if future is not None:
+                self._inflight -= 1
+                item = self._build_track(item, future.result())
+            self._commit(item, changed)
+
+    def _build_track(self, job: _ParseJob, metadata: tuple) -> Track:
+        artist, album, title, duration, track_number, art = metadata
+        fn = job.filename
+
+        # If title is not available, use filename without extension
+        if not title:
+            title = os.path.splitext(fn)[0]
+
+        logger.debug(f"    - {fn} (id: {job.tid[:8]}...)")
+        track = Track(
+            id=job.tid,
+            rel_path=job.rel_path,
+            filename=fn,
+            folder=job.folder.rel_path,
+            ext=os.path.splitext(fn)[1].lower().lstrip("."),
+            cover_rel_path=job.folder.cover_rel_path,
+            artist=artist,
+            album=album,
+            title=title,
+            duration=duration,
+            track_number=track_number,
+            folder_mtime=job.folder.mtime,
+            folder_btime=job.folder.btime,
+            file_size=job.file_size,
+            file_mtime=job.file_mtime,
+            file_inode=job.file_inode,
+            art_offset=art[0],
+            art_size=art[1],
+            art_mime=art[2],
+            art_hash=art[3],
+        )
+        if job.prev is None:
+            self._diff.added.append(job.tid)
+        elif track != job.prev:
+            self._diff.changed.append(job.tid)
+        return track
+
+    def _commit(self, item: Union[Track, _Rows], changed: bool = False) -> None:
+        if isinstance(item, _Rows):
+            self.builder.add_rows(self.prev_store, item.start, item.stop)
+            self._kept[item.start:item.stop] = b"\1" * (item.stop - item.start)
+            return
+        if changed:
+            self._diff.changed.append(item.id)
+        row = self.prev_store.index_of(item.id)
+        if row >= 0:
+            self._kept[row] = 1
+        self.builder.add(item)
+
+
+def scan_library(
+    music_dir: str,
+    previous: Optional[ScanResult] = None,
+    full: bool = False,
+    workers: int = 0,
+    executor: str = "thread",
+    changed_folders: Optional[AbstractSet[str]] = None,
+    tag_reader: str = "mutagen",
+    progress: Optional[Callable[[ScanProgress], None]] = None,
+) -> ScanResult:
+    """Scan music_dir and build the track table.
+
+    With a previous result (e.g. loaded from the on-disk index) the scan is
+    incremental: unchanged folders are not listed again and only new or
+    modified files are parsed with mutagen. The returned diff lists the track
+    IDs added, removed and changed relative to previous.
+
+    workers > 0 parses tags on a pool: executor="thread" suits network mounts
+    (I/O-bound), "process" suits local disks where parsing is CPU-bound.
+
+    changed_folders restricts disk access to those folders (relative paths,
+    "" for the root) and folders that appeared beneath them.
+
+    tag_reader="partial" reads only the tag region of each file instead of
+    letting mutagen load it (pictures included), which cuts I/O on network
+    mounts; the resulting tracks are the same.
+
+    progress(ScanProgress) is called after every folder; raising
+    ScanCancelled from it stops the scan, and the exception propagates.
+    """
+    if tag_reader not in TAG_READERS:
+        raise ValueError(f"Invalid tag reader: {tag_reader}")
+    music_dir = os.path.abspath(music_dir)
+    logger.info(
+        f"Scanning: {music_dir}{' (full)' if full else ''}"
+        + (f" ({len(changed_folders)} changed folders)" if changed_folders is not None else "")
+        + (f" with {workers} {executor} workers" if workers > 0 else "")
+    )
+
+    pool = _make_executor(workers, executor)
+    try:
+        scanner = _Scanner(
+            music_dir,
+            previous,
+            full,
+            pool=pool,
+            max_inflight=workers * 16,
+            changed_folders=changed_folders,
+            extract=TAG_READERS[tag_reader],
+            progress=progress,
+        )
+        result = scanner.run()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
 
-    logger.info(f"Scan complete: {len(tracks)} tracks from {folder_count} folders")
-    return tracks, order
+    logger.info(
+        f"Scan complete: {len(result.tracks)} tracks from {scanner.audio_folder_count} folders "
+        f"({scanner.listed_count} folders listed, {scanner.parsed_count} files parsed; "
+        f"+{len(result.diff.added)} -{len(result.diff.removed)} ~{len(result.diff.changed)})"
+    )
+    return result
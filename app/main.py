@@ -1,25 +1,62 @@
 from __future__ import annotations
 
+import base64
+import dataclasses
+import hashlib
 import logging
 import mimetypes
 import os
+import random
 import threading
 import time
 import uuid
 from contextlib import asynccontextmanager
-from typing import AsyncIterator, Dict, List, Optional
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Sequence, Set, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from .config import DATA_DIR, MUSIC_DIR, QUEUE_REFRESH_SECONDS, SCAN_ON_START
-from .covers import ensure_cover_cached
-from .library import scan_library
-from .models import Track
+from .config import (
+    BATCH_CACHE_SIZE,
+    COVER_CACHE_MB,
+    COVER_PREFETCH,
+    COVER_PREFETCH_PAUSE_STREAMS,
+    COVER_PREFETCH_RATE,
+    COVER_PREFETCH_WORKERS,
+    DATA_DIR,
+    LIBRARY_INDEX,
+    MUSIC_DIR,
+    QUEUE_REFRESH_SECONDS,
+    SCAN_EXECUTOR,
+    SCAN_ON_START,
+    SCAN_TAG_READER,
+    SCAN_WORKERS,
+    SHARED_LIBRARY,
+    SHARED_POLL_SECONDS,
+    WATCH_DEBOUNCE_SECONDS,
+    WATCH_MAX_DIRS,
+    WATCH_MODE,
+    WATCH_POLL_SECONDS,
+)
+from .birthtime import get_birthtime_provider
+from .cache import LRUCache
+from .events import EventBroadcaster
+from .covers import THUMBNAIL_SIZES, CoverResolver
+from .index import LibraryIndex
+from .jobs import RescanJob
+from .library import LibrarySnapshot, ScanProgress, ScanResult, scan_library
+from .models import LibraryDiff
 from .player import PlayerState
+from .prefetch import CoverPrefetcher
+from .serialize import FastJSONResponse, dumps
+from .shared import SharedLibrary, SharedPlayerState
+from .shuffle import QueueCursor, ShuffledRows, seed_from_string
+from .store import TrackStore
+from .streaming import AudioFileResponse, active_streams
+from .watcher import LibraryWatcher
 
 
 logging.basicConfig(
@@ -28,10 +65,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-_tracks: Dict[str, Track] = {}
-_track_ids: List[str] = []
+# The current library. Replaced as a whole, never modified: request handlers
+# read the reference once and need no lock.
+_library: LibrarySnapshot = LibrarySnapshot.empty()
 _player = PlayerState()
-_library_lock = threading.RLock()
+# Writers only: orders snapshot swaps with their events and player updates.
+_publish_lock = threading.Lock()
+_rescan_lock = threading.Lock()
+# With SHARED_LIBRARY: the library file and rescan control shared by the workers.
+_shared: Optional[SharedLibrary] = None
+_shared_stop = threading.Event()
+_watcher: Optional[LibraryWatcher] = None
+
+def _events_snapshot() -> dict:
+    library = _library
+    return {"player": _player.summary(), "library": {"library_version": library.version, "tracks": len(library.tracks)}}
+
+
+# Server-Sent Events: "player" on every PlayerState change, "library" when a
+# scan changes the library, "state" (both) for new or resyncing clients.
+_events = EventBroadcaster(_events_snapshot)
+_player.set_listener(lambda summary: _events.publish("player", summary))
+
+BATCH_MAX_AGE_SECONDS = 60
+# Library reads are validated by the store fingerprint: shared caches may keep
+# them briefly and then revalidate with If-None-Match (a cheap 304).
+LIBRARY_CACHE_CONTROL = "public, max-age=10"
+# Cover images are content-addressed and never change; the per-track redirect
+# to them is only briefly cacheable since a track's art can be replaced.
+COVER_CACHE_CONTROL = "public, max-age=31536000, immutable"
+COVER_REDIRECT_CACHE_CONTROL = "public, max-age=300"
+_batch_cache: LRUCache[bytes] = LRUCache(BATCH_CACHE_SIZE)
+# With a shared library only the scanning worker writes the cover manifest.
+_covers = CoverResolver(DATA_DIR, COVER_CACHE_MB * 1024 * 1024, writer=not SHARED_LIBRARY)
+_prefetcher = CoverPrefetcher(
+    _covers,
+    MUSIC_DIR,
+    workers=COVER_PREFETCH_WORKERS,
+    rate=COVER_PREFETCH_RATE,
+    # Yield to audio responses in flight.
+    is_busy=lambda: 0 < COVER_PREFETCH_PAUSE_STREAMS <= active_streams(),
+)
 
 
 class ModeRequest(BaseModel):
@@ -52,6 +126,12 @@ class BatchRequest(BaseModel):
     time_margin_days: int = 7
     date_type: str = "mtime"
     seed: Optional[str] = None
+    # Continue a previous batch; overrides mode, time_margin_days, date_type and seed.
+    cursor: Optional[str] = None
+
+
+class TracksBatchRequest(BaseModel):
+    ids: List[str]
 
 
 class BatchResponse(BaseModel):
@@ -60,6 +140,8 @@ class BatchResponse(BaseModel):
     generated_at: float
     settings: dict
     total_available: int
+    offset: int = 0
+    next_cursor: Optional[str] = None
 
 
 @asynccontextmanager
@@ -71,15 +153,71 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         raise RuntimeError(f"MUSIC_DIR does not exist: {MUSIC_DIR}")
     
     os.makedirs(DATA_DIR, exist_ok=True)
+    get_birthtime_provider(MUSIC_DIR)
     
-    if SCAN_ON_START:
-        logger.info(f"Scanning music directory: {MUSIC_DIR}")
-        refresh_library()
-        logger.info(f"Found {len(_tracks)} tracks")
+    global _shared
+    if SHARED_LIBRARY:
+        _shared = SharedLibrary(DATA_DIR, MUSIC_DIR)
+        _player.share(SharedPlayerState(DATA_DIR))
+        # Serve whatever another worker (or the last run) published.
+        try:
+            _follow_published()
+        except Exception as e:
+            logger.warning(f"Failed to load the shared library: {e}")
+    
+    if _shared is None or _shared.try_become_scanner():
+        _start_scanning()
+    else:
+        logger.info("Following the library published by another worker")
+    
+    follower = None
+    if _shared is not None:
+        follower = threading.Thread(target=_follow_shared, name="shared-library", daemon=True)
+        follower.start()
     
     yield
     
     logger.info("Shutting down Random Music Server")
+    _shared_stop.set()
+    if _watcher is not None:
+        _watcher.stop()
+    _rescan_job.cancel()
+    _prefetcher.stop()
+    if follower is not None:
+        follower.join()
+    if _shared is not None:
+        _shared.close()  # lets another worker take over scans
+
+
+def _start_scanning() -> None:
+    """Index load, startup scan and watcher: the work of the process that owns the library."""
+    global _watcher
+    
+    if LIBRARY_INDEX:
+        _load_library_index()
+    
+    # Reads every old per-track image once after an upgrade: keep it off startup.
+    threading.Thread(target=_maintain_covers, name="cover-sweep", daemon=True).start()
+    
+    if SCAN_ON_START:
+        # Serve from the index (if any) while the filesystem is reconciled.
+        logger.info(f"Scanning music directory in background: {MUSIC_DIR}")
+        _rescan_job.start(full=True)
+    
+    _watcher = LibraryWatcher(
+        MUSIC_DIR,
+        _on_library_change,
+        mode=WATCH_MODE,
+        debounce=WATCH_DEBOUNCE_SECONDS,
+        poll_interval=WATCH_POLL_SECONDS,
+        max_watches=WATCH_MAX_DIRS,
+    )
+    _watcher.start()
+
+
+def _maintain_covers() -> None:
+    _covers.become_writer()
+    _covers.remove_legacy_files()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -111,10 +249,19 @@ def _guess_audio_mime(ext: str) -> str:
 
 @app.get("/health")
 def health() -> dict:
+    library = _library
     return {
         "status": "healthy",
-        "tracks": len(_tracks),
+        "tracks": len(library.tracks),
         "music_dir": MUSIC_DIR,
+        "library_version": library.version,
+        "batch_cache": _batch_cache.stats(),
+        "covers": _covers.stats(),
+        "cover_prefetch": _prefetcher.stats(),
+        "rescan": _rescan_status()["state"],
+        "shared_library": None if _shared is None else ("scanner" if _shared.is_scanner else "follower"),
+        "active_streams": active_streams(),
+        "event_subscribers": _events.subscriber_count(),
     }
 
 
@@ -126,51 +273,331 @@ def index() -> HTMLResponse:
         return HTMLResponse(f.read())
 
 
-@app.post("/api/rescan")
-def refresh_library() -> dict:
-    global _tracks, _track_ids
+def _load_library_index() -> None:
+    global _library
+    
+    try:
+        loaded = LibraryIndex(DATA_DIR).load(MUSIC_DIR)
+    except Exception as e:
+        logger.warning(f"Failed to load library index: {e}")
+        return
+    if loaded is None:
+        return
+    
+    with _publish_lock:
+        had_library = len(_library.tracks) > 0
+        _library = LibrarySnapshot.build(loaded.tracks, loaded.folders, _library.version + 1, on_json_index=_share if _shared is not None else None)
+        _events.publish("library", {"library_version": _library.version, "tracks": len(_library.tracks)})
+        if had_library:
+            # Already playing a published library: keep its queue.
+            _player.apply_library_diff(_library.tracks, LibraryDiff())
+        else:
+            _player.set_library(_library.tracks)
+    if COVER_PREFETCH:
+        _prefetcher.start(loaded.tracks)
+
+
+def _rescan(
+    full: bool = False,
+    changed_folders: Optional[Set[str]] = None,
+    progress: Optional[Callable[[ScanProgress], None]] = None,
+) -> LibraryDiff:
+    # One scan at a time: each one builds on the result of the previous.
+    with _rescan_lock:
+        return _rescan_locked(full, changed_folders, progress)
+
+
+def _rescan_locked(
+    full: bool,
+    changed_folders: Optional[Set[str]],
+    progress: Optional[Callable[[ScanProgress], None]],
+) -> LibraryDiff:
+    global _library
     
-    logger.info("Starting library rescan")
-    tracks, order = scan_library(MUSIC_DIR)
+    # Scan against the current snapshot; _rescan_lock keeps other scans out
+    # until the result replaces it.
+    current = _library
+    previous = ScanResult(current.tracks, current.folders) if len(current.tracks) else None
+    result = scan_library(
+        MUSIC_DIR,
+        previous=previous,
+        full=full,
+        workers=SCAN_WORKERS,
+        executor=SCAN_EXECUTOR,
+        changed_folders=changed_folders if previous is not None else None,
+        tag_reader=SCAN_TAG_READER,
+        progress=progress,
+    )
+    diff = result.diff
+    changed = previous is None or not diff.is_empty()
+    
+    with _publish_lock:
+        # Indexes are built before the swap (the JSON index in the
+        # background); readers keep using the old snapshot meanwhile and
+        # never wait.
+        snapshot = LibrarySnapshot.build(
+            result.tracks, result.folders, _library.version + (1 if changed else 0),
+            on_json_index=_share if _shared is not None else None,
+        )
+        _library = snapshot
+        if changed:
+            _batch_cache.clear()
+            _events.publish("library", {
+                "library_version": snapshot.version,
+                "tracks": len(snapshot.tracks),
+                "added": len(diff.added),
+                "removed": len(diff.removed),
+                "changed": len(diff.changed),
+            })
+        if previous is None:
+            _player.set_library(snapshot.tracks)
+        elif not diff.is_empty():
+            _player.apply_library_diff(snapshot.tracks, diff)
     
-    with _library_lock:
-        _tracks = tracks
-        _track_ids = order
-        _player.set_library(_tracks, _track_ids)
+    if LIBRARY_INDEX and (previous is None or not diff.is_empty() or result.folders != previous.folders):
+        try:
+            LibraryIndex(DATA_DIR).save(MUSIC_DIR, result)
+        except Exception as e:
+            logger.warning(f"Failed to save library index: {e}")
     
-    logger.info(f"Rescan complete: {len(_tracks)} tracks")
-    return {"tracks": len(_tracks)}
+    if COVER_PREFETCH:
+        _prefetcher.start(result.tracks)
+    
+    logger.info(f"Rescan complete: {len(snapshot.tracks)} tracks")
+    return diff
+
+
+# Scans started from the API (and at startup) run here, one at a time.
+_rescan_job = RescanJob(lambda full, progress: _rescan(full=full, progress=progress))
+
+
+def _share(snapshot: LibrarySnapshot) -> None:
+    # Runs once the snapshot's JSON index is built, since the file carries it.
+    # Snapshots are built under _publish_lock, so this waits for the swap; a
+    # snapshot replaced meanwhile is skipped (its successor publishes), and
+    # the file only moves forward.
+    if _shared is None:
+        return
+    with _publish_lock:
+        if _library is not snapshot or _shared.published_version == snapshot.version:
+            return
+        try:
+            _shared.publish(snapshot)
+        except Exception as e:
+            logger.warning(f"Failed to publish shared library: {e}")
+
+
+def _follow_published() -> None:
+    """Switch to a library another worker published, if there is a new one."""
+    global _library
+    
+    snapshot = _shared.poll()
+    if snapshot is None:
+        return
+    with _publish_lock:
+        _library = snapshot
+        _batch_cache.clear()
+        _events.publish("library", {"library_version": snapshot.version, "tracks": len(snapshot.tracks)})
+        _player.follow_library(snapshot.tracks)
+
+
+def _follow_shared() -> None:
+    """Keep this worker in step with the others, every SHARED_POLL_SECONDS.
+
+    Followers pick up new libraries and take over scans when the scanner
+    goes away; the scanner runs the rescans other workers ask for and
+    publishes the job's status for them. Every worker checks the shared
+    player state, so its clients get events for changes made elsewhere.
+    """
+    last_status = None
+    while not _shared_stop.wait(SHARED_POLL_SECONDS):
+        try:
+            _player.refresh()
+            if not _shared.is_scanner:
+                _follow_published()
+                _covers.refresh()
+                if _shared.try_become_scanner():
+                    logger.info("Taking over library scans")
+                    _start_scanning()
+                continue
+            if _shared.take_cancel():
+                _rescan_job.cancel()
+            request = _shared.rescan_request()
+            if request is not None:
+                _rescan_job.start(full=request[0] == "full")
+            status = _rescan_job.status()
+            if status != last_status:
+                _shared.write_status(status)
+                last_status = status
+            if request is not None:
+                # Only now, so followers never see the request gone and the
+                # old status; one made since is kept for the next round.
+                _shared.clear_rescan_request(request[1])
+        except Exception:
+            logger.exception("Shared library update failed")
+
+
+def _is_follower() -> bool:
+    return _shared is not None and not _shared.is_scanner
+
+
+def _rescan_status() -> dict:
+    if not _is_follower():
+        return _rescan_job.status()
+    # The scanner's job, "pending" while it hasn't picked up a request.
+    status = _shared.read_status() or {"id": 0, "state": "idle"}
+    if _shared.rescan_requested() is not None and status["state"] not in ("running", "cancelling"):
+        status["state"] = "pending"
+    return status
+
+
+def _on_library_change(changed_folders: Optional[Set[str]]) -> None:
+    if changed_folders is not None:
+        logger.info(f"Filesystem changes in {len(changed_folders)} folders")
+    _rescan(changed_folders=changed_folders)
+
+
+@app.post("/api/rescan", status_code=202)
+def refresh_library(full: bool = False) -> dict:
+    """Start a rescan in the background, incremental or (full=true) re-verifying every file.
+    
+    A call while a scan is running joins it ("joined": true) instead of
+    starting another; a full one asked for during an incremental scan is
+    queued to run next ("queued_full": true). The library is served unchanged until the scan is
+    published; follow it with /api/rescan/status.
+    """
+    if _is_follower():
+        # Scans belong to the scanner worker; it picks the request up shortly.
+        _shared.request_rescan(full)
+        status = _rescan_status()
+        return {**status, "joined": status["state"] in ("running", "cancelling")}
+    status, joined = _rescan_job.start(full=full)
+    if not joined:
+        logger.info("Starting library rescan")
+    return {**status, "joined": joined}
+
+
+@app.get("/api/rescan/status")
+def rescan_status() -> dict:
+    """State of the current or last rescan: counts, throughput, ETA and result."""
+    return _rescan_status()
+
+
+@app.post("/api/rescan/cancel")
+def cancel_rescan() -> dict:
+    """Abandon the running rescan; the current library stays as it is."""
+    if _is_follower():
+        ok = _shared.clear_rescan_request()
+        if _rescan_status()["state"] in ("running", "cancelling"):
+            _shared.request_cancel()
+            ok = True
+        return {"ok": ok, **_rescan_status()}
+    return {"ok": _rescan_job.cancel(), **_rescan_job.status()}
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    # Weak comparison, as RFC 9110 asks for If-None-Match.
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (t.strip().removeprefix("W/") for t in if_none_match.split(","))
+
+
+def _conditional_json(
+    if_none_match: Optional[str],
+    etag: str,
+    cache_control: str,
+    build: Callable[[], dict],
+) -> Response:
+    """304 if the client's copy is current, else build() as JSON with the ETag."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(build(), headers=headers)
+
+
+def _library_etag(store: TrackStore) -> str:
+    return f'"{store.fingerprint}"'
+
+
+# Queue items carry these track fields besides their position.
+_STATE_FIELDS = ("id", "filename", "folder", "ext", "artist", "album", "title", "duration", "track_number", "folder_mtime")
 
 
 @app.get("/api/state")
-def state() -> dict:
-    _player.maybe_refresh_queue(_track_ids, QUEUE_REFRESH_SECONDS)
-    state_data = _player.queue_window(window_size=10)
+def state(if_none_match: Optional[str] = Header(default=None)) -> Response:
+    _player.maybe_refresh_queue(QUEUE_REFRESH_SECONDS)
+    store = _library.tracks
+    
+    # Per-process player state: revalidate every time, never share.
+    etag = f'"{_player.state_tag()}-{store.fingerprint}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    
+    window_store, rows, summary = _player.queue_window_rows(window_size=10)
     # Add mode, time margin, and date type info to state
-    state_data["mode"] = _player.get_mode()
-    state_data["time_margin_days"] = _player.get_time_margin_days()
-    state_data["date_type"] = _player.get_date_type()
-    return state_data
+    summary["mode"] = _player.get_mode()
+    summary["time_margin_days"] = _player.get_time_margin_days()
+    summary["date_type"] = _player.get_date_type()
+    
+    # Queue items are assembled from the store's pre-encoded fields.
+    index = window_store.json_index
+    columns = index.columns(_STATE_FIELDS)
+    items = [
+        index.object(row, columns, b'"position":%d,"is_current":%s' % (position, b"true" if is_current else b"false"))
+        for row, position, is_current in rows
+    ]
+    body = b'{"queue":[' + b",".join(items) + b"]," + dumps(summary)[1:]
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/events")
+async def events(request: Request, last_event_id: Optional[str] = Header(default=None)) -> StreamingResponse:
+    """Server-Sent Events stream of player and library changes.
+    
+    Reconnecting clients send Last-Event-ID (EventSource does this itself)
+    and receive only the events they missed, or one "state" snapshot.
+    """
+    try:
+        since = int(last_event_id) if last_event_id else None
+    except ValueError:
+        since = None
+    return StreamingResponse(
+        _events.stream(since, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/settings")
-def get_settings() -> dict:
+def get_settings(if_none_match: Optional[str] = Header(default=None)) -> Response:
     """Get current player settings (mode, time margin, and date type)."""
-    return {
-        "mode": _player.get_mode(),
-        "time_margin_days": _player.get_time_margin_days(),
-        "date_type": _player.get_date_type(),
-        "available_modes": ["full_random", "recent_albums"],
-        "available_time_margins": [7, 14, 30, 90],
-        "available_date_types": ["mtime", "btime"]
-    }
+    mode = _player.get_mode()
+    time_margin_days = _player.get_time_margin_days()
+    date_type = _player.get_date_type()
+    
+    def build() -> dict:
+        return {
+            "mode": mode,
+            "time_margin_days": time_margin_days,
+            "date_type": date_type,
+            "available_modes": ["full_random", "recent_albums"],
+            "available_time_margins": [7, 14, 30, 90],
+            "available_date_types": ["mtime", "btime"]
+        }
+    
+    # The body is a function of these three values alone.
+    etag = f'"{mode}-{time_margin_days}-{date_type}"'
+    return _conditional_json(if_none_match, etag, "private, no-cache", build)
 
 
 @app.post("/api/settings/mode")
 def set_mode(request: ModeRequest) -> dict:
     """Set the player mode."""
     try:
-        _player.set_mode(request.mode, _track_ids)
+        _player.set_mode(request.mode)
         return {"ok": True, "mode": request.mode}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -180,7 +607,7 @@ def set_mode(request: ModeRequest) -> dict:
 def set_time_margin(request: TimeMarginRequest) -> dict:
     """Set the time margin for recent albums mode."""
     try:
-        _player.set_time_margin_days(request.days, _track_ids)
+        _player.set_time_margin_days(request.days)
         return {"ok": True, "time_margin_days": request.days}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -190,49 +617,118 @@ def set_time_margin(request: TimeMarginRequest) -> dict:
 def set_date_type(request: DateTypeRequest) -> dict:
     """Set the date type for recent albums mode (mtime or btime)."""
     try:
-        _player.set_date_type(request.date_type, _track_ids)
+        _player.set_date_type(request.date_type)
         return {"ok": True, "date_type": request.date_type}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+LIBRARY_FIELDS = ("id", "rel_path", "filename", "folder", "ext", "artist", "album", "title", "duration", "track_number")
+_DEFAULT_LIBRARY_FIELDS = ("id", "filename", "folder", "ext")
+_LIBRARY_PAGE_MAX = 5000
+_LIBRARY_CHUNK_ROWS = 256
+
+
+def _library_cursor(store: TrackStore, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{store.fingerprint}:{offset}".encode("ascii")).rstrip(b"=").decode("ascii")
+
+
+def _library_offset(store: TrackStore, cursor: str) -> int:
+    try:
+        fingerprint, offset = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("ascii").split(":")
+        offset_value = int(offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if fingerprint != store.fingerprint:
+        # Rows moved; continuing would skip or repeat tracks.
+        raise HTTPException(status_code=409, detail="Library changed, restart the listing")
+    return max(0, offset_value)
+
+
+def _library_json_chunks(store: TrackStore, start: int, stop: int, fields: Tuple[str, ...]) -> Iterator[List[bytes]]:
+    """Encoded JSON objects for rows [start, stop), a bounded chunk at a time."""
+    index = store.json_index
+    columns = index.columns(fields)
+    for chunk_start in range(start, stop, _LIBRARY_CHUNK_ROWS):
+        yield [index.object(row, columns) for row in range(chunk_start, min(chunk_start + _LIBRARY_CHUNK_ROWS, stop))]
+
+
 @app.get("/api/library/info")
-def library_info() -> dict:
-    """Get information about the scanned library."""
-    with _library_lock:
-        track_list = []
-        for tid in _track_ids:
-            t = _tracks.get(tid)
-            if t:
-                track_list.append({
-                    "id": tid,
-                    "filename": t.filename,
-                    "folder": t.folder,
-                    "ext": t.ext
-                })
-        return {
-            "total_tracks": len(_tracks),
-            "tracks": track_list
-        }
+def library_info(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = "json",
+    if_none_match: Optional[str] = Header(default=None),
+) -> Response:
+    """Get information about the scanned library.
+    
+    Without limit the whole listing is returned in the original shape, but
+    generated row by row so memory doesn't grow with the library. limit and
+    cursor page through it (next_cursor in the body, or the X-Next-Cursor
+    header for NDJSON). fields=id,title,artist picks the per-track fields;
+    format=ndjson streams one track object per line.
+    """
+    # The snapshot's store never changes, however long the listing takes.
+    store = _library.tracks
+    
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Invalid format: {format}")
+    selected = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else _DEFAULT_LIBRARY_FIELDS
+    unknown = [f for f in selected if f not in LIBRARY_FIELDS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {','.join(unknown)}")
+    if limit is not None and not 0 < limit <= _LIBRARY_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {_LIBRARY_PAGE_MAX}")
+    
+    start = _library_offset(store, cursor) if cursor else 0
+    start = min(start, len(store))
+    stop = len(store) if limit is None else min(start + limit, len(store))
+    next_cursor = _library_cursor(store, stop) if stop < len(store) else None
+    
+    etag = _library_etag(store)
+    headers = {"ETag": etag, "Cache-Control": LIBRARY_CACHE_CONTROL}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    if next_cursor is not None:
+        headers["X-Next-Cursor"] = next_cursor
+    
+    if format == "ndjson":
+        def ndjson() -> Iterator[bytes]:
+            for chunk in _library_json_chunks(store, start, stop, selected):
+                yield b"\n".join(chunk) + b"\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers)
+    
+    def document() -> Iterator[bytes]:
+        yield b'{"total_tracks":%d,"tracks":[' % len(store)
+        separator = b""
+        for chunk in _library_json_chunks(store, start, stop, selected):
+            yield separator + b",".join(chunk)
+            separator = b","
+        if limit is None:
+            yield b"]}"
+        else:
+            yield b'],"next_cursor":' + dumps(next_cursor) + b"}"
+    return StreamingResponse(document(), media_type="application/json", headers=headers)
 
 
 @app.post("/api/player/next")
 def player_next() -> dict:
-    _player.maybe_refresh_queue(_track_ids, QUEUE_REFRESH_SECONDS)
+    _player.maybe_refresh_queue(QUEUE_REFRESH_SECONDS)
     tid = _player.next()
     return {"id": tid}
 
 
 @app.post("/api/player/prev")
 def player_prev() -> dict:
-    _player.maybe_refresh_queue(_track_ids, QUEUE_REFRESH_SECONDS)
+    _player.maybe_refresh_queue(QUEUE_REFRESH_SECONDS)
     tid = _player.prev()
     return {"id": tid}
 
 
 @app.post("/api/player/jump/{track_id}")
 def player_jump(track_id: str) -> dict:
-    _player.maybe_refresh_queue(_track_ids, QUEUE_REFRESH_SECONDS)
+    _player.maybe_refresh_queue(QUEUE_REFRESH_SECONDS)
     tid = _player.jump_to(track_id)
     if tid is None:
         return {"error": "Track not found in queue"}
@@ -245,162 +741,247 @@ def player_stop() -> dict:
     return {"ok": True}
 
 
+_TRACKS_BATCH_MAX = 500
+
+
 @app.get("/api/tracks/{track_id}")
-def get_track(track_id: str) -> dict:
-    with _library_lock:
-        t = _tracks.get(track_id)
-    if t is None:
+def get_track(track_id: str, if_none_match: Optional[str] = Header(default=None)) -> Response:
+    store = _library.tracks
+    row = store.index_of(track_id)
+    if row < 0:
         raise HTTPException(status_code=404, detail="Not found")
-    return {
-        "id": t.id,
-        "rel_path": t.rel_path,
-        "filename": t.filename,
-        "folder": t.folder,
-        "ext": t.ext,
-        "artist": t.artist,
-        "album": t.album,
-        "title": t.title,
-        "duration": t.duration,
-        "track_number": t.track_number,
-    }
+    
+    etag = _library_etag(store)
+    headers = {"ETag": etag, "Cache-Control": LIBRARY_CACHE_CONTROL}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    index = store.json_index
+    return Response(content=index.object(row, index.columns(LIBRARY_FIELDS)), media_type="application/json", headers=headers)
 
 
-@app.get("/api/tracks/{track_id}/stream")
-def stream_track(track_id: str) -> FileResponse:
-    with _library_lock:
-        t = _tracks.get(track_id)
+@app.post("/api/tracks/batch")
+def get_tracks_batch(request: TracksBatchRequest) -> Response:
+    """Metadata for several tracks in one response, in the order asked for.
+    
+    Unknown IDs are listed under "missing" rather than failing the request,
+    since a queue can outlive a rescan.
+    """
+    if len(request.ids) > _TRACKS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {_TRACKS_BATCH_MAX} ids per request")
+    store = _library.tracks
+    
+    index = store.json_index
+    columns = index.columns(LIBRARY_FIELDS)
+    fragments: List[bytes] = []
+    missing: List[str] = []
+    for track_id in request.ids:
+        row = store.index_of(track_id)
+        if row < 0:
+            missing.append(track_id)
+        else:
+            fragments.append(index.object(row, columns))
+    body = b'{"tracks":[' + b",".join(fragments) + b'],"missing":' + dumps(missing) + b"}"
+    return Response(content=body, media_type="application/json")
+
+
+@app.api_route("/api/tracks/{track_id}/stream", methods=["GET", "HEAD"])
+def stream_track(track_id: str) -> AudioFileResponse:
+    t = _library.tracks.get(track_id)
     if t is None:
         raise HTTPException(status_code=404, detail="Not found")
 
-    abs_path = _abs_music_path(t.rel_path)
-    if not os.path.exists(abs_path):
-        raise HTTPException(status_code=404, detail="File missing")
-
-    return FileResponse(
-        abs_path,
+    # Validators come from the scan's stat; the response opens the file
+    # itself and answers 404 if it has gone missing since.
+    return AudioFileResponse(
+        _abs_music_path(t.rel_path),
+        size=t.file_size,
+        mtime=t.file_mtime,
+        inode=t.file_inode,
         media_type=_guess_audio_mime(t.ext),
         filename=t.filename,
     )
 
 
+def _cover_size(size: str) -> Optional[int]:
+    if size == "full":
+        return None
+    if size.isdigit() and int(size) in THUMBNAIL_SIZES:
+        return int(size)
+    allowed = ", ".join(str(s) for s in THUMBNAIL_SIZES)
+    raise HTTPException(status_code=400, detail=f"size must be one of {allowed} or full")
+
+
 @app.get("/api/tracks/{track_id}/cover")
-def track_cover(track_id: str):
-    with _library_lock:
-        t = _tracks.get(track_id)
+def track_cover(track_id: str, size: str = "full"):
+    _cover_size(size)
+    t = _library.tracks.get(track_id)
     if t is None:
         raise HTTPException(status_code=404, detail="Not found")
 
-    # Prefer embedded cover, cache it to DATA_DIR.
-    abs_audio = _abs_music_path(t.rel_path)
-    cached = ensure_cover_cached(data_dir=DATA_DIR, track_id=t.id, audio_abs_path=abs_audio)
-    if cached is not None and os.path.exists(cached):
-        return FileResponse(cached)
-
-    # Fallback to folder cover image.
-    if t.cover_rel_path is None:
+    # Embedded cover first, then the folder image; both are stored once per
+    # distinct image and served from one immutable URL.
+    folder_cover = _abs_music_path(t.cover_rel_path) if t.cover_rel_path is not None else None
+    name = _covers.cover_for(t, _abs_music_path(t.rel_path), folder_cover)
+    if name is None:
         raise HTTPException(status_code=404, detail="No cover")
+    return RedirectResponse(
+        f"/api/covers/{name}" if size == "full" else f"/api/covers/{name}?size={size}",
+        status_code=307,
+        headers={"Cache-Control": COVER_REDIRECT_CACHE_CONTROL},
+    )
 
-    abs_cover = _abs_music_path(t.cover_rel_path)
-    if not os.path.exists(abs_cover):
-        raise HTTPException(status_code=404, detail="No cover")
 
-    return FileResponse(abs_cover)
-
-
-@app.post("/api/queue/batch")
-def get_queue_batch(request: BatchRequest) -> BatchResponse:
-    """Generate a new queue batch for a client."""
-    import random
-    
-    with _library_lock:
-        # Validate inputs
-        if request.mode not in ("full_random", "recent_albums"):
-            raise HTTPException(status_code=400, detail=f"Invalid mode: {request.mode}")
-        if request.time_margin_days not in (7, 14, 30, 90):
-            raise HTTPException(status_code=400, detail=f"Invalid time margin: {request.time_margin_days}")
-        if request.date_type not in ("mtime", "btime"):
-            raise HTTPException(status_code=400, detail=f"Invalid date type: {request.date_type}")
-        
-        # Filter tracks based on mode (similar to PlayerState._reshuffle_locked)
-        if request.mode == "recent_albums":
-            current_time = time.time()
-            margin_seconds = request.time_margin_days * 24 * 60 * 60
-            threshold = current_time - margin_seconds
-            
-            # Get unique folders with their date
-            folder_tracks: Dict[str, List[str]] = {}
-            folder_dates: Dict[str, float] = {}
-            
-            for tid in _track_ids:
-                track = _tracks.get(tid)
-                if track:
-                    folder_date = None
-                    if request.date_type == "mtime" and track.folder_mtime:
-                        folder_date = track.folder_mtime
-                    elif request.date_type == "btime" and track.folder_btime:
-                        folder_date = track.folder_btime
-                    
-                    if folder_date is not None:
-                        if track.folder not in folder_tracks:
-                            folder_tracks[track.folder] = []
-                            folder_dates[track.folder] = folder_date
-                        folder_tracks[track.folder].append(tid)
-            
-            # Filter folders by date
-            recent_folders = [
-                folder for folder, date in folder_dates.items()
-                if date >= threshold
-            ]
-            
-            # Get all tracks from recent folders
-            filtered_track_ids = []
-            for folder in recent_folders:
-                filtered_track_ids.extend(folder_tracks[folder])
-        else:
-            # Full random mode - use all tracks
-            filtered_track_ids = _track_ids
-        
-        # If no tracks match the criteria, return empty batch
-        if not filtered_track_ids:
-            return BatchResponse(
-                track_ids=[],
-                batch_id=str(uuid.uuid4()),
-                generated_at=time.time(),
-                settings={
-                    "mode": request.mode,
-                    "time_margin_days": request.time_margin_days,
-                    "date_type": request.date_type
-                },
-                total_available=len(_track_ids)
-            )
-        
-        # Shuffle the filtered tracks
-        # Use seed if provided, otherwise generate random
-        if request.seed:
-            # Create deterministic random from seed
-            seed_hash = hash(request.seed) & 0xFFFFFFFF
-            rnd = random.Random(seed_hash)
-        else:
-            rnd = random.Random()
-        
-        shuffled = list(filtered_track_ids)
-        rnd.shuffle(shuffled)
-        
-        # Take requested size (or all if fewer available)
-        batch_size = min(request.size, len(shuffled))
-        batch_ids = shuffled[:batch_size]
-        
+@app.get("/api/covers/{name}")
+def cover_image(name: str, size: str = "full", if_none_match: Optional[str] = Header(default=None)):
+    pixels = _cover_size(size)
+    path = _covers.path(name)
+    if path is None or not _covers.exists(name):
+        raise HTTPException(status_code=404, detail="Not found")
+    # The name is the content hash, so with the size it is a strong validator.
+    etag = f'"{name.split(".")[0]}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": COVER_CACHE_CONTROL}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    variant = _covers.variant(name, pixels)
+    cached = _covers.read(variant)
+    if cached is not None:
+        data, media_type = cached
+        return Response(content=data, media_type=media_type, headers=headers)
+    return FileResponse(os.path.join(_covers.covers_dir, variant), headers=headers)
+
+
+def _batch_cursor(request: BatchRequest) -> QueueCursor:
+    # Bounded like /api/tracks/batch: a batch costs O(size), and bodies go in the cache.
+    if not 1 <= request.size <= _TRACKS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"size must be between 1 and {_TRACKS_BATCH_MAX}")
+    if request.cursor:
+        try:
+            return QueueCursor.decode(request.cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Validate inputs
+    if request.mode not in ("full_random", "recent_albums"):
+        raise HTTPException(status_code=400, detail=f"Invalid mode: {request.mode}")
+    if request.time_margin_days not in (7, 14, 30, 90):
+        raise HTTPException(status_code=400, detail=f"Invalid time margin: {request.time_margin_days}")
+    if request.date_type not in ("mtime", "btime"):
+        raise HTTPException(status_code=400, detail=f"Invalid date type: {request.date_type}")
+    
+    # Use seed if provided, otherwise generate random
+    if request.seed:
+        # Deterministic across workers and restarts (unlike hash())
+        seed = seed_from_string(request.seed)
+    else:
+        seed = random.getrandbits(64)
+    
+    threshold = None
+    if request.mode == "recent_albums":
+        # Whole minutes, so repeated seeded requests share a cache entry.
+        now = time.time() // 60 * 60
+        threshold = now - request.time_margin_days * 24 * 60 * 60
+    return QueueCursor(seed, request.mode, request.time_margin_days, request.date_type, threshold)
+
+
+def _build_batch(store: TrackStore, cursor: QueueCursor, size: int, batch_id: Optional[str] = None) -> BatchResponse:
+    batch_id = batch_id or str(uuid.uuid4())
+    settings = {
+        "mode": cursor.mode,
+        "time_margin_days": cursor.time_margin_days,
+        "date_type": cursor.date_type
+    }
+    
+    # Filter tracks based on mode (same rules as PlayerState._reshuffle_locked)
+    if cursor.threshold is not None:
+        filtered_rows: Sequence[int] = store.folder_dates.since(cursor.date_type, cursor.threshold)
+    else:
+        # Full random mode - use all tracks
+        filtered_rows = range(len(store))
+    
+    # If no tracks match the criteria, return empty batch
+    if not filtered_rows:
         return BatchResponse(
-            track_ids=batch_ids,
-            batch_id=str(uuid.uuid4()),
+            track_ids=[],
+            batch_id=batch_id,
             generated_at=time.time(),
-            settings={
-                "mode": request.mode,
-                "time_margin_days": request.time_margin_days,
-                "date_type": request.date_type
-            },
-            total_available=len(filtered_track_ids)
+            settings=settings,
+            total_available=len(store)
         )
+    
+    # Only the requested positions of the shuffle are ever computed, so any
+    # page costs the same as the first.
+    shuffled = ShuffledRows(filtered_rows, cursor.seed)
+    start = min(cursor.offset, len(shuffled))
+    end = min(start + max(size, 0), len(shuffled))
+    batch_ids = [store.id_at(shuffled[k]) for k in range(start, end)]
+    
+    return BatchResponse(
+        track_ids=batch_ids,
+        batch_id=batch_id,
+        generated_at=time.time(),
+        settings=settings,
+        total_available=len(filtered_rows),
+        offset=start,
+        # None once the whole shuffle has been handed out.
+        next_cursor=dataclasses.replace(cursor, offset=end).encode() if end < len(shuffled) else None,
+    )
+
+
+def _queue_batch_response(request: BatchRequest, if_none_match: Optional[str]) -> Response:
+    cursor = _batch_cursor(request)
+    
+    # One snapshot for the whole batch; a rescan swaps in a new one.
+    store = _library.tracks
+    
+    if not request.seed and not request.cursor:
+        # A fresh random shuffle: never the same twice, nothing to cache.
+        batch = _build_batch(store, cursor, request.size)
+        return FastJSONResponse(batch.model_dump(), headers={"Cache-Control": "no-store"})
+    
+    key = (store.fingerprint, cursor.mode, cursor.time_margin_days, cursor.date_type, cursor.threshold, cursor.seed, cursor.offset, request.size)
+    # The batch is a function of the key alone, so the validator and batch_id
+    # come from it: every worker, and a refill after the cache is cleared,
+    # gives the same ones. Weak, since generated_at differs between copies.
+    digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=16).digest()
+    etag = f'W/"{digest.hex()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={BATCH_MAX_AGE_SECONDS}"}
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    
+    body = _batch_cache.get(key)
+    if body is None:
+        body = dumps(_build_batch(store, cursor, request.size, batch_id=str(uuid.UUID(bytes=digest))).model_dump())
+        _batch_cache.put(key, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/api/queue/batch", response_model=BatchResponse)
+def get_queue_batch(request: BatchRequest, if_none_match: Optional[str] = Header(default=None)) -> Response:
+    """Generate a new queue batch for a client, or continue one from its next_cursor."""
+    return _queue_batch_response(request, if_none_match)
+
+
+@app.get("/api/queue/batch", response_model=BatchResponse)
+def get_queue_batch_cacheable(
+    size: int = 50,
+    mode: str = "full_random",
+    time_margin_days: int = 7,
+    date_type: str = "mtime",
+    seed: Optional[str] = None,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+) -> Response:
+    """GET form of /api/queue/batch, so HTTP caches can store seeded batches."""
+    request = BatchRequest(
+        size=size,
+        mode=mode,
+        time_margin_days=time_margin_days,
+        date_type=date_type,
+        seed=seed,
+        cursor=cursor,
+    )
+    return _queue_batch_response(request, if_none_match)
 
 
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "static"))
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -19,3 +19,34 @@ class Track:
     track_number: Optional[int] = None
     folder_mtime: Optional[float] = None  # folder modification time in seconds since epoch
     folder_btime: Optional[float] = None  # folder creation/birth time in seconds since epoch
+    file_size: Optional[int] = None  # audio file size in bytes at scan time
+    file_mtime: Optional[float] = None  # audio file modification time at scan time
+    file_inode: Optional[int] = None  # audio file inode at scan time
+    # Embedded cover art as seen by the scan. art_size is 0 for "none" and
+    # None when not recorded; art_offset is None if the bytes aren't stored
+    # verbatim in the file.
+    art_offset: Optional[int] = None
+    art_size: Optional[int] = None
+    art_mime: Optional[str] = None
+    art_hash: Optional[str] = None  # cover_hash() of the image bytes
+
+
+@dataclass(frozen=True)
+class FolderEntry:
+    """Directory listing recorded by the scanner, used to skip unchanged folders."""
+    rel_path: str  # "" for the music root
+    mtime: Optional[float]
+    btime: Optional[float]
+    cover_rel_path: Optional[str]
+    subdirs: Tuple[str, ...] = ()  # child directory names, sorted
+    audio_files: Tuple[str, ...] = ()  # audio file names, sorted
+
+
+@dataclass
+class LibraryDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
@@ -1,157 +1,294 @@
 from __future__ import annotations
 
-import random
 import threading
 import time
-from typing import Dict, List, Optional
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Sequence, Tuple
 
-from .models import Track
+from .models import LibraryDiff
+from .shuffle import StableShuffledRows
+from .store import TrackStore
+
+if TYPE_CHECKING:
+    from .shared import SharedPlayerState
 
 
 class PlayerState:
+    """Server-side play queue over the current TrackStore.
+
+    The queue is the filtered rows (a range or the folder-date index's
+    RowRanges) ordered by a seeded hash of each track's ID, so a rescan
+    leaves the upcoming tracks where they were; it is rebuilt only when the
+    seed, filter or library changes, and stepping and jumping are O(1).
+
+    Every change bumps version and hands a small summary (see summary()) to
+    the listener, which pushes it to connected clients.
+
+    With share(), the state lives in a SharedPlayerState that every worker
+    process uses: each operation first adopts changes other processes made
+    (rebuilding the queue only if the stored seed or filter changed) and
+    each change is written back, so all workers play the same queue.
+    """
+
     def __init__(self) -> None:
         self._lock = threading.RLock()
-        self._queue: List[str] = []
+        self._store: TrackStore = TrackStore.empty()
+        self._queue: StableShuffledRows = StableShuffledRows(range(0), [], 0)
+        # (store, seed, threshold, date_type) the queue was built for.
+        self._queue_for: Optional[tuple] = None
         self._pos: int = 0
-        self._tracks: Dict[str, Track] = {}
         self._last_shuffle_seed: Optional[int] = None
+        # Folder-date cut-off the queue was filtered with (None: all tracks).
+        self._threshold: Optional[float] = None
         self._mode: str = "full_random"  # "full_random" or "recent_albums"
         self._time_margin_days: int = 7  # 7, 14, 30, 90 days
         self._date_type: str = "mtime"  # "mtime" (modification) or "btime" (creation/birth)
+        self._version: int = 0
+        # Versions restart with the process; the epoch keeps ETags distinct.
+        self._epoch: str = uuid.uuid4().hex[:8]
+        self._listener: Optional[Callable[[dict], None]] = None
+        self._sync: Optional["SharedPlayerState"] = None
 
-    def set_library(self, tracks: Dict[str, Track], track_ids: List[str]) -> None:
+    def share(self, sync: "SharedPlayerState") -> None:
+        """Keep this state in step with other processes through sync.
+
+        A state already stored there is adopted; otherwise this one is stored.
+        """
         with self._lock:
-            self._tracks = tracks
-            self._reshuffle_locked(track_ids)
+            self._sync = sync
+            with sync.lock():
+                if sync.read() is not None:
+                    self._pull_locked()
+                else:
+                    self._version += 1
+                    sync.write(self._version, self._shared_fields_locked())
 
-    def get_mode(self) -> str:
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
         with self._lock:
-            return self._mode
+            if self._sync is None:
+                yield
+                return
+            with self._sync.lock():
+                self._pull_locked()
+                yield
+
+    def _shared_fields_locked(self) -> dict:
+        return {
+            "epoch": self._epoch,
+            "seed": self._last_shuffle_seed,
+            "threshold": self._threshold,
+            "pos": self._pos,
+            "mode": self._mode,
+            "time_margin_days": self._time_margin_days,
+            "date_type": self._date_type,
+        }
+
+    def _pull_locked(self) -> None:
+        if self._sync.version() == self._version:
+            return
+        record = self._sync.read()
+        if record is None:
+            return
+        self._version, fields = record
+        self._epoch = fields["epoch"]
+        self._last_shuffle_seed = fields["seed"]
+        self._threshold = fields["threshold"]
+        self._mode = fields["mode"]
+        self._time_margin_days = fields["time_margin_days"]
+        self._date_type = fields["date_type"]
+        self._rebuild_queue_locked()
+        # The writer may briefly have a newer library than this process.
+        self._pos = min(fields["pos"], max(0, len(self._queue) - 1))
+        if self._listener is not None:
+            self._listener(self._summary_locked())
 
-    def set_mode(self, mode: str, track_ids: List[str]) -> None:
+    def refresh(self) -> None:
+        """Adopt changes other processes made to the shared state, if any."""
+        with self._locked():
+            pass
+
+    def set_listener(self, listener: Optional[Callable[[dict], None]]) -> None:
+        """Call listener(summary) after every change, in version order."""
         with self._lock:
+            self._listener = listener
+
+    def _changed_locked(self) -> None:
+        self._version += 1
+        if self._sync is not None:
+            self._sync.write(self._version, self._shared_fields_locked())
+        if self._listener is not None:
+            self._listener(self._summary_locked())
+
+    def _summary_locked(self) -> dict:
+        current = self._store.id_at(self._queue[self._pos]) if self._queue else None
+        return {
+            "version": self._version,
+            "current_id": current,
+            "current_index": self._pos if self._queue else -1,
+            "total_tracks": len(self._queue),
+            "shuffle_seed": self._last_shuffle_seed,
+            "mode": self._mode,
+            "time_margin_days": self._time_margin_days,
+            "date_type": self._date_type,
+        }
+
+    def state_tag(self) -> str:
+        """Changes whenever anything in summary() or queue_window() may have."""
+        with self._locked():
+            return f"{self._epoch}-{self._version}"
+
+    def summary(self) -> dict:
+        with self._locked():
+            return self._summary_locked()
+
+    def set_library(self, store: TrackStore) -> None:
+        with self._locked():
+            self._store = store
+            self._reshuffle_locked()
+
+    def apply_library_diff(self, store: TrackStore, diff: LibraryDiff) -> None:
+        """Update the library after an incremental rescan without a new shuffle.
+
+        The queue is rebuilt over the new library with the same seed, which
+        keeps the order of the tracks that remain, and the position is
+        re-anchored on the current track so it keeps playing. If the current
+        track is gone, the position stays where it was.
+        """
+        with self._locked():
+            current = self._store.id_at(self._queue[self._pos]) if self._queue else None
+            self._store = store
+            if self._last_shuffle_seed is None:
+                self._reshuffle_locked()
+                return
+
+            self._threshold = self._recent_threshold_locked()
+            self._rebuild_queue_locked()
+            row = store.index_of(current) if current is not None else -1
+            try:
+                self._pos = self._queue.index(row)
+            except ValueError:
+                self._pos = min(self._pos, max(0, len(self._queue) - 1))
+            self._changed_locked()
+
+    def follow_library(self, store: TrackStore) -> None:
+        """Switch to a library another process scanned, keeping the shared queue.
+
+        The process that scanned it updates the queue itself (set_library or
+        apply_library_diff); this only rebuilds it over the new store.
+        """
+        with self._locked():
+            self._store = store
+            self._rebuild_queue_locked()
+            self._pos = min(self._pos, max(0, len(self._queue) - 1))
+
+    def _rebuild_queue_locked(self) -> None:
+        built_for = (self._store, self._last_shuffle_seed, self._threshold, self._date_type)
+        if self._queue_for is not None and self._queue_for[0] is self._store and self._queue_for[1:] == built_for[1:]:
+            return  # e.g. another process only moved the position
+        if self._last_shuffle_seed is None:
+            self._queue = StableShuffledRows(range(0), [], 0)
+        else:
+            self._queue = StableShuffledRows(self._filtered_rows_locked(), self._store.id_prefixes(), self._last_shuffle_seed)
+        self._queue_for = built_for
+
+    def _recent_threshold_locked(self) -> Optional[float]:
+        if self._mode != "recent_albums":
+            return None
+        return time.time() - self._time_margin_days * 24 * 60 * 60
+
+    def _filtered_rows_locked(self) -> Sequence[int]:
+        threshold = self._threshold
+        if threshold is None:
+            # Full random mode - use all tracks
+            return range(len(self._store))
+        # No fallback to all tracks: no recent albums means an empty queue.
+        return self._store.folder_dates.since(self._date_type, threshold)
+
+    def get_mode(self) -> str:
+        with self._locked():
+            return self._mode
+
+    def set_mode(self, mode: str) -> None:
+        with self._locked():
             if mode not in ("full_random", "recent_albums"):
                 raise ValueError(f"Invalid mode: {mode}")
             self._mode = mode
-            self._reshuffle_locked(track_ids)
+            self._reshuffle_locked()
 
     def get_time_margin_days(self) -> int:
-        with self._lock:
+        with self._locked():
             return self._time_margin_days
 
-    def set_time_margin_days(self, days: int, track_ids: List[str]) -> None:
-        with self._lock:
+    def set_time_margin_days(self, days: int) -> None:
+        with self._locked():
             if days not in (7, 14, 30, 90):
                 raise ValueError(f"Invalid time margin: {days}")
             self._time_margin_days = days
-            self._reshuffle_locked(track_ids)
+            self._reshuffle_locked()
 
     def get_date_type(self) -> str:
-        with self._lock:
+        with self._locked():
             return self._date_type
 
-    def set_date_type(self, date_type: str, track_ids: List[str]) -> None:
-        with self._lock:
+    def set_date_type(self, date_type: str) -> None:
+        with self._locked():
             if date_type not in ("mtime", "btime"):
                 raise ValueError(f"Invalid date type: {date_type}")
             self._date_type = date_type
-            self._reshuffle_locked(track_ids)
-
-    def _reshuffle_locked(self, track_ids: List[str]) -> None:
-        if not track_ids:
-            self._queue = []
-            self._pos = 0
-            return
-
-        # Filter tracks based on mode
-        if self._mode == "recent_albums":
-            current_time = time.time()
-            margin_seconds = self._time_margin_days * 24 * 60 * 60
-            threshold = current_time - margin_seconds
-            
-            # Get unique folders with their date (mtime or btime based on setting)
-            folder_tracks: Dict[str, List[str]] = {}
-            folder_dates: Dict[str, float] = {}
-            
-            for tid in track_ids:
-                track = self._tracks.get(tid)
-                # Use the appropriate date based on date_type setting
-                if track:
-                    folder_date = None
-                    if self._date_type == "mtime" and track.folder_mtime:
-                        folder_date = track.folder_mtime
-                    elif self._date_type == "btime" and track.folder_btime:
-                        folder_date = track.folder_btime
-                    
-                    if folder_date is not None:
-                        if track.folder not in folder_tracks:
-                            folder_tracks[track.folder] = []
-                            folder_dates[track.folder] = folder_date
-                        folder_tracks[track.folder].append(tid)
-            
-            # Filter folders by date
-            recent_folders = [
-                folder for folder, date in folder_dates.items()
-                if date >= threshold
-            ]
-            
-            # Get all tracks from recent folders
-            filtered_track_ids = []
-            for folder in recent_folders:
-                filtered_track_ids.extend(folder_tracks[folder])
-            
-            # Don't fall back to all tracks - keep empty if no recent albums
-            # This will result in an empty queue
-        else:
-            # Full random mode - use all tracks
-            filtered_track_ids = track_ids
+            self._reshuffle_locked()
 
-        self._queue = list(filtered_track_ids)
+    def _reshuffle_locked(self) -> None:
         seed = int(time.time())
         self._last_shuffle_seed = seed
-        rnd = random.Random(seed)
-        rnd.shuffle(self._queue)
+        self._threshold = self._recent_threshold_locked()
+        self._rebuild_queue_locked()
         self._pos = 0
+        self._changed_locked()
 
-    def maybe_refresh_queue(self, track_ids: List[str], refresh_seconds: int) -> None:
+    def maybe_refresh_queue(self, refresh_seconds: int) -> None:
         if refresh_seconds <= 0:
             return
-        with self._lock:
+        with self._locked():
             if not self._queue:
-                self._reshuffle_locked(track_ids)
+                self._reshuffle_locked()
                 return
             if self._last_shuffle_seed is None:
-                self._reshuffle_locked(track_ids)
+                self._reshuffle_locked()
                 return
             if int(time.time()) - self._last_shuffle_seed >= refresh_seconds:
-                self._reshuffle_locked(track_ids)
+                self._reshuffle_locked()
 
     def current_id(self) -> Optional[str]:
-        with self._lock:
+        with self._locked():
             if not self._queue:
                 return None
-            return self._queue[self._pos]
+            return self._store.id_at(self._queue[self._pos])
 
     def next(self) -> Optional[str]:
-        with self._lock:
+        with self._locked():
             if not self._queue:
                 return None
             self._pos = (self._pos + 1) % len(self._queue)
-            return self._queue[self._pos]
+            self._changed_locked()
+            return self._store.id_at(self._queue[self._pos])
 
     def prev(self) -> Optional[str]:
-        with self._lock:
+        with self._locked():
             if not self._queue:
                 return None
             self._pos = (self._pos - 1) % len(self._queue)
-            return self._queue[self._pos]
+            self._changed_locked()
+            return self._store.id_at(self._queue[self._pos])
 
     def stop(self) -> None:
-        with self._lock:
+        with self._locked():
             self._pos = 0
+            self._changed_locked()
 
-    def queue_window(self, window_size: int = 10) -> dict:
-        """Get a window of songs around current position.
+    def queue_window_rows(self, window_size: int = 10) -> Tuple[TrackStore, List[Tuple[int, int, bool]], dict]:
+        """The store, (row, position, is_current) for each song in the window, and the queue summary.
         
         Logic:
         - Start at top (positions 0-9)
@@ -159,12 +296,12 @@ class PlayerState:
         - Window shifts forward when moving to position 6+
         - Window doesn't shift backward (previous songs stay in same view position)
         """
-        with self._lock:
+        with self._locked():
             if not self._queue:
-                return {"queue": [], "current_index": -1, "current_id": None}
+                return self._store, [], {"current_index": -1, "current_id": None, "version": self._version}
 
             total = len(self._queue)
-            cur_id = self._queue[self._pos]
+            cur_id = self._store.id_at(self._queue[self._pos])
             
             # Calculate window start position
             # Start at top until we reach position 5
@@ -178,69 +315,66 @@ class PlayerState:
                 # and current at position 4 in window (5th position)
                 start = self._pos - 4
             
-            # Get window of songs
-            window = []
-            for i in range(window_size):
-                idx = start + i
-                # Don't wrap around - only show what exists
-                if idx >= total:
-                    break
-                    
-                tid = self._queue[idx]
-                t = self._tracks.get(tid)
-                
-                item = {
-                    "id": tid,
-                    "position": idx,
-                    "is_current": (idx == self._pos)
-                }
-                
-                if t:
-                    item["filename"] = t.filename
-                    item["folder"] = t.folder
-                    item["ext"] = t.ext
-                    item["artist"] = t.artist
-                    item["album"] = t.album
-                    item["title"] = t.title
-                    item["duration"] = t.duration
-                    item["track_number"] = t.track_number
-                    item["folder_mtime"] = t.folder_mtime
-                
-                window.append(item)
+            # Don't wrap around - only show what exists
+            window = [(self._queue[idx], idx, idx == self._pos) for idx in range(start, min(start + window_size, total))]
             
-            return {
-                "queue": window,
+            return self._store, window, {
                 "current_index": self._pos,
                 "current_id": cur_id,
-                "total_tracks": total
+                "total_tracks": total,
+                "version": self._version
             }
     
+    def queue_window(self, window_size: int = 10) -> dict:
+        """Get a window of songs around current position (see queue_window_rows)."""
+        store, rows, summary = self.queue_window_rows(window_size)
+        window = []
+        for row, idx, is_current in rows:
+            t = store.track(row)
+            window.append({
+                "id": t.id,
+                "position": idx,
+                "is_current": is_current,
+                "filename": t.filename,
+                "folder": t.folder,
+                "ext": t.ext,
+                "artist": t.artist,
+                "album": t.album,
+                "title": t.title,
+                "duration": t.duration,
+                "track_number": t.track_number,
+                "folder_mtime": t.folder_mtime,
+            })
+        return {"queue": window, **summary}
+    
     def jump_to(self, track_id: str) -> Optional[str]:
         """Jump to a specific track by ID."""
-        with self._lock:
+        with self._locked():
             if not self._queue:
                 return None
+            row = self._store.index_of(track_id)
+            if row < 0:
+                return None
             try:
-                self._pos = self._queue.index(track_id)
+                self._pos = self._queue.index(row)
+                self._changed_locked()
                 return track_id
             except ValueError:
                 return None
     
     def sidebar(self, n: int = 5) -> dict:
         """Legacy method for backward compatibility."""
-        with self._lock:
+        with self._locked():
             if not self._queue:
                 return {"current": None, "previous": [], "next": []}
 
             cur = self._queue[self._pos]
 
-            prev_ids = [self._queue[(self._pos - i) % len(self._queue)] for i in range(n, 0, -1)]
-            next_ids = [self._queue[(self._pos + i) % len(self._queue)] for i in range(1, n + 1)]
+            prev_rows = [self._queue[(self._pos - i) % len(self._queue)] for i in range(n, 0, -1)]
+            next_rows = [self._queue[(self._pos + i) % len(self._queue)] for i in range(1, n + 1)]
 
-            def _meta(tid: str) -> dict:
-                t = self._tracks.get(tid)
-                if t is None:
-                    return {"id": tid}
+            def _meta(row: int) -> dict:
+                t = self._store.track(row)
                 return {
                     "id": t.id,
                     "filename": t.filename,
@@ -250,6 +384,6 @@ class PlayerState:
 
             return {
                 "current": _meta(cur),
-                "previous": [_meta(tid) for tid in prev_ids],
-                "next": [_meta(tid) for tid in next_ids],
+                "previous": [_meta(row) for row in prev_rows],
+                "next": [_meta(row) for row in next_rows],
             }
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from .covers import THUMBNAIL_SIZES, CoverResolver
+from .models import Track
+from .store import TrackStore
+
+
+logger = logging.getLogger(__name__)
+
+
+def _lower_thread_priority() -> None:
+    # Linux applies nice values per thread; elsewhere this is a no-op.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except (AttributeError, OSError):
+        pass
+
+
+class CoverPrefetcher:
+    """Resolves every track's cover in the background after a scan.
+
+    Embedded art is extracted, folder covers are copied and thumbnails are
+    made ahead of the first request, so cover requests in steady state are
+    plain file serves. At most `workers` tracks are in flight, at no more
+    than `rate` tracks per second (0 = unthrottled), on low-priority
+    threads, and the pass pauses while is_busy() (e.g. many audio streams
+    in flight). Progress lives in the resolver's manifest: a restarted pass
+    skips tracks that are already resolved, so it resumes where the last
+    one stopped. A new scan replaces the running pass.
+    """
+
+    def __init__(
+        self,
+        resolver: CoverResolver,
+        music_dir: str,
+        workers: int = 2,
+        rate: float = 20.0,
+        is_busy: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.resolver = resolver
+        self.music_dir = os.path.abspath(music_dir)
+        self.workers = max(1, workers)
+        self.rate = rate
+        self.is_busy = is_busy or (lambda: False)
+        self.resolved = 0
+        self.skipped = 0
+        self.paused = False
+        self.running = False
+        self._pending: Optional[TrackStore] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, store: TrackStore) -> None:
+        """Queue a pass over store, replacing any pass in progress."""
+        with self._lock:
+            self._pending = store
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cover-prefetch", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "paused": self.paused,
+            "resolved": self.resolved,
+            "skipped": self.skipped,
+        }
+
+    def _take_pending(self) -> Optional[TrackStore]:
+        with self._lock:
+            store, self._pending = self._pending, None
+            return store
+
+    def _run(self) -> None:
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="cover-prefetch", initializer=_lower_thread_priority) as pool:
+            while not self._stop.is_set():
+                self._wake.wait()
+                self._wake.clear()
+                store = self._take_pending()
+                if store is None:
+                    continue
+                self.running = True
+                try:
+                    self._pass(store, pool)
+                finally:
+                    self.running = False
+                    self.paused = False
+
+    def _pass(self, store: TrackStore, pool: ThreadPoolExecutor) -> None:
+        started = time.monotonic()
+        slots = threading.BoundedSemaphore(self.workers)
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        next_at = time.monotonic()
+        resolved = 0
+        for track in store.values():
+            if self._wake.is_set() or self._stop.is_set():
+                return  # superseded by a newer scan, or shutting down
+            if self.resolver.is_resolved(track):
+                self.skipped += 1
+                continue
+            while self.is_busy() and not self._stop.is_set():
+                self.paused = True
+                self._stop.wait(1.0)
+            self.paused = False
+            if interval:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                next_at = max(next_at, time.monotonic()) + interval
+            slots.acquire()
+            pool.submit(self._resolve, track, slots)
+            resolved += 1
+        for _ in range(self.workers):
+            slots.acquire()  # wait for the last tracks in flight
+        if resolved:
+            logger.info(f"Resolved covers for {resolved} tracks in {time.monotonic() - started:.1f}s")
+
+    def _resolve(self, track: Track, slots: threading.BoundedSemaphore) -> None:
+        try:
+            folder_cover = os.path.join(self.music_dir, track.cover_rel_path) if track.cover_rel_path else None
+            name = self.resolver.cover_for(track, os.path.join(self.music_dir, track.rel_path), folder_cover)
+            if name is not None:
+                for size in THUMBNAIL_SIZES:
+                    self.resolver.variant(name, size)
+            self.resolved += 1
+        except Exception as e:
+            logger.warning(f"Cover prefetch failed for {track.rel_path}: {e}")
+        finally:
+            slots.release()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import json
+from array import array
+from typing import TYPE_CHECKING, Any, Sequence, Tuple, Union
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional: the standard library encoder is used instead
+    orjson = None
+
+if TYPE_CHECKING:
+    from .store import TrackStore
+
+
+# Per-track fields a client can ask for, in the order they're written.
+TRACK_FIELDS = (
+    "id", "rel_path", "filename", "folder", "ext", "artist", "album", "title",
+    "duration", "track_number", "folder_mtime",
+)
+_SHARED_FIELDS = {"folder", "ext", "artist", "album", "folder_mtime"}
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON, with orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass  # e.g. lone surrogates from undecodable filenames
+    try:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    except UnicodeEncodeError:
+        return json.dumps(obj, separators=(",", ":")).encode("ascii")
+
+
+# Field position and encoded "name": prefix, for TrackJsonIndex.columns().
+_KEYS = {name: (i, dumps(name) + b":") for i, name in enumerate(TRACK_FIELDS)}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class TrackJsonIndex:
+    """Every track's TRACK_FIELDS values, encoded as JSON once per store.
+
+    The encoded values sit in one blob with an offset per (row, field), so a
+    response for any rows and any subset of fields is assembled from bytes
+    slices without building dicts or running an encoder. Values shared by
+    many tracks (folders, artists, albums, extensions) are encoded once.
+    """
+
+    def __init__(self, store: "TrackStore") -> None:
+        blob = bytearray()
+        offsets = array("Q", [0])
+        # Field values shared by many tracks get a memo; the rest are unique.
+        memos = [{} if name in _SHARED_FIELDS else None for name in TRACK_FIELDS]
+        fields = tuple(zip(TRACK_FIELDS, memos))
+        for row in range(len(store)):
+            t = store.track(row)
+            for name, memo in fields:
+                value = getattr(t, name)
+                if memo is None:
+                    blob += dumps(value)
+                else:
+                    data = memo.get(value)
+                    if data is None:
+                        data = memo[value] = dumps(value)
+                    blob += data
+                offsets.append(len(blob))
+        self._blob = bytes(blob)
+        self._offsets = array("I", offsets) if len(blob) < 2 ** 32 else offsets
+
+    @classmethod
+    def from_buffers(cls, blob: Union[bytes, memoryview], offsets: Sequence[int]) -> "TrackJsonIndex":
+        """Index over an existing blob and offsets (see buffers()), e.g. views of an mmap."""
+        index = cls.__new__(cls)
+        index._blob = blob
+        index._offsets = offsets
+        return index
+
+    def buffers(self) -> Tuple[Union[bytes, memoryview], Sequence[int]]:
+        return self._blob, self._offsets
+
+    def columns(self, fields: Sequence[str]) -> Tuple[Tuple[int, bytes], ...]:
+        """Resolve field names once for object(); raises KeyError for unknown ones."""
+        return tuple(_KEYS[name] for name in fields)
+
+    def object(self, row: int, columns: Tuple[Tuple[int, bytes], ...], extra: bytes = b"") -> bytes:
+        """JSON object with the given columns of row, then the encoded members in extra."""
+        blob, offsets = self._blob, self._offsets
+        base = row * len(TRACK_FIELDS)
+        members = [key + blob[offsets[base + i]:offsets[base + i + 1]] for i, key in columns]
+        if extra:
+            members.append(extra)
+        return b"{" + b",".join(members) + b"}"
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._blob) + self._offsets.itemsize * len(self._offsets)
+
+
+class TrackJsonEncoder:
+    """TrackJsonIndex's interface over a store whose index isn't built yet.
+
+    Each row asked for is encoded on the spot, so a response never waits
+    for the whole index.
+    """
+
+    def __init__(self, store: "TrackStore") -> None:
+        self._store = store
+
+    def columns(self, fields: Sequence[str]) -> Tuple[Tuple[int, bytes], ...]:
+        return tuple(_KEYS[name] for name in fields)
+
+    def object(self, row: int, columns: Tuple[Tuple[int, bytes], ...], extra: bytes = b"") -> bytes:
+        t = self._store.track(row)
+        members = [key + dumps(getattr(t, TRACK_FIELDS[i])) for i, key in columns]
+        if extra:
+            members.append(extra)
+        return b"{" + b",".join(members) + b"}"
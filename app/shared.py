@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where shared mode is unsupported
+    fcntl = None
+
+from .library import LibrarySnapshot
+from .serialize import TRACK_FIELDS, TrackJsonIndex
+from .store import TrackStore
+
+
+logger = logging.getLogger(__name__)
+
+
+LIBRARY_FILENAME = "library.map"
+PLAYER_FILENAME = "player.map"
+SCANNER_LOCK_FILENAME = "scanner.lock"
+RESCAN_REQUEST_FILENAME = "rescan.request"
+RESCAN_LOCK_FILENAME = "rescan.lock"
+RESCAN_CANCEL_FILENAME = "rescan.cancel"
+RESCAN_STATUS_FILENAME = "rescan.status"
+
+_MAGIC = b"RMSLIB01"
+_HEADER = struct.Struct("<8sQ")  # magic, header JSON length
+# Column layout, JSON index fields and byte order; a file from another
+# version is ignored.
+_SIGNATURE = f"{sys.byteorder}:" + ",".join(
+    f"{name}:{typecode or 'bytes'}" for name, typecode in TrackStore.COLUMNS.items()
+) + ";json:" + ",".join(TRACK_FIELDS)
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _write_atomic(path: str, chunks) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_library(path: str, music_dir: str, snapshot: LibrarySnapshot) -> None:
+    """Write snapshot's store and JSON index in a layout read_library() maps without copying."""
+    views = snapshot.tracks.column_views()
+    blob, offsets = snapshot.tracks.full_json_index().buffers()
+    views["json"] = memoryview(blob).cast("B")
+    views["json_offsets"] = memoryview(offsets).cast("B")
+
+    sections: Dict[str, Tuple[int, int]] = {}
+    pos = 0
+    for name, view in views.items():
+        sections[name] = (pos, view.nbytes)
+        pos = _align(pos + view.nbytes)
+    header = json.dumps({
+        "signature": _SIGNATURE,
+        "music_dir": os.path.abspath(music_dir),
+        "version": snapshot.version,
+        "json_offsets_typecode": memoryview(offsets).format,
+        "sections": sections,
+    }).encode("utf-8")
+
+    def chunks() -> Iterator[bytes]:
+        yield _HEADER.pack(_MAGIC, len(header))
+        yield header
+        written = _align(_HEADER.size + len(header))
+        yield b"\0" * (written - _HEADER.size - len(header))
+        for name, view in views.items():
+            yield view
+            yield b"\0" * (_align(view.nbytes) - view.nbytes)
+
+    _write_atomic(path, chunks())
+
+
+def read_library(path: str, music_dir: str) -> Optional[LibrarySnapshot]:
+    """Map a file written by write_library(); None if missing, damaged or from another version.
+
+    The store's columns are views of the read-only mapping, so every process
+    that maps the same file shares one copy in the page cache. The mapping
+    lives as long as the store does, even after the file is replaced.
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, header_len = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC:
+            return None
+        header = json.loads(mapped[_HEADER.size:_HEADER.size + header_len])
+        if header.get("signature") != _SIGNATURE or header.get("music_dir") != os.path.abspath(music_dir):
+            return None
+
+        base = _align(_HEADER.size + header_len)
+        data = memoryview(mapped)
+        views = {}
+        for name, (start, length) in header["sections"].items():
+            if start < 0 or length < 0 or base + start + length > len(data):
+                raise ValueError(f"section {name} runs past the end of the file")
+            views[name] = data[base + start:base + start + length]
+        tracks = TrackStore.from_views(views)
+        offsets = views["json_offsets"].cast(header["json_offsets_typecode"])
+        if len(offsets) != len(tracks) * len(TRACK_FIELDS) + 1 or offsets[-1] != len(views["json"]):
+            raise ValueError("JSON index does not match the tracks")
+        tracks.use_json_index(TrackJsonIndex.from_buffers(views["json"], offsets))
+        version = int(header["version"])
+    except (struct.error, ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+        # Truncated, half-written by something other than write_library(), or corrupt.
+        logger.warning(f"Ignoring unreadable shared library file {path}: {e}")
+        return None
+    # Followers don't scan, so they don't need the folder listings.
+    return LibrarySnapshot.build(tracks, {}, version)
+
+
+class SharedLibrary:
+    """The library, and control of rescans, shared by the worker processes of one server.
+
+    One process, the scanner, holds an exclusive lock on DATA_DIR/scanner.lock
+    for as long as it runs; it alone scans and watches the music directory,
+    and publishes every snapshot to DATA_DIR/library.map (written aside and
+    renamed into place). The other workers map that file read-only and pick
+    up a new version when poll() sees the file replaced. When the scanner
+    exits the kernel drops its lock, and the next worker to ask takes over.
+
+    Followers pass rescan and cancel requests to the scanner as small files
+    next to it, and read the scanner's job status back the same way.
+    """
+
+    def __init__(self, data_dir: str, music_dir: str) -> None:
+        if fcntl is None:
+            raise RuntimeError("Shared library mode needs fcntl (not available on this platform)")
+        self.data_dir = data_dir
+        self.music_dir = music_dir
+        self.path = os.path.join(data_dir, LIBRARY_FILENAME)
+        self._lock_fd: Optional[int] = None
+        self._mapped: Optional[Tuple[int, int]] = None  # (st_dev, st_ino) of the file in use
+        self.published_version: Optional[int] = None  # library version in that file
+
+    @property
+    def is_scanner(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_become_scanner(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(os.path.join(self.data_dir, SCANNER_LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def close(self) -> None:
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the lock
+            self._lock_fd = None
+
+    # library ---------------------------------------------------------------
+
+    def publish(self, snapshot: LibrarySnapshot) -> None:
+        write_library(self.path, self.music_dir, snapshot)
+        st = os.stat(self.path)
+        self._mapped = (st.st_dev, st.st_ino)
+        self.published_version = snapshot.version
+
+    def poll(self) -> Optional[LibrarySnapshot]:
+        """The published snapshot if it changed since the last call, else None."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        if (st.st_dev, st.st_ino) == self._mapped:
+            return None
+        snapshot = read_library(self.path, self.music_dir)
+        self._mapped = (st.st_dev, st.st_ino)
+        self.published_version = None if snapshot is None else snapshot.version
+        return snapshot
+
+    # rescan requests ---------------------------------------------------------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.data_dir, name)
+
+    @contextmanager
+    def _request_lock(self) -> Iterator[None]:
+        # Serialises changes to the request file between workers.
+        fd = os.open(self._file(RESCAN_LOCK_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def request_rescan(self, full: bool) -> None:
+        with self._request_lock():
+            if not full and self.rescan_requested() == "full":
+                return  # a pending full request covers this one
+            kind = "full" if full else "incremental"
+            # Every request gets its own token, so the scanner only clears what it took.
+            _write_atomic(self._file(RESCAN_REQUEST_FILENAME), [f"{kind} {uuid.uuid4().hex}".encode("ascii")])
+
+    def rescan_request(self) -> Optional[Tuple[str, str]]:
+        """(kind, token) of the pending request, or None; kind is "full" or "incremental"."""
+        try:
+            with open(self._file(RESCAN_REQUEST_FILENAME), "rb") as f:
+                kind, _, token = f.read().decode("ascii", "replace").partition(" ")
+        except OSError:
+            return None
+        return kind, token
+
+    def rescan_requested(self) -> Optional[str]:
+        """Kind of the pending request, or None."""
+        request = self.rescan_request()
+        return None if request is None else request[0]
+
+    def clear_rescan_request(self, token: Optional[str] = None) -> bool:
+        """Drop the pending request; with a token, only if it is still the request that token came with."""
+        with self._request_lock():
+            if token is not None:
+                request = self.rescan_request()
+                if request is None or request[1] != token:
+                    return False  # a newer request replaced it: leave that for the next poll
+            try:
+                os.remove(self._file(RESCAN_REQUEST_FILENAME))
+                return True
+            except OSError:
+                return False
+
+    def request_cancel(self) -> None:
+        _write_atomic(self._file(RESCAN_CANCEL_FILENAME), [b""])
+
+    def take_cancel(self) -> bool:
+        try:
+            os.remove(self._file(RESCAN_CANCEL_FILENAME))
+            return True
+        except OSError:
+            return False
+
+    def write_status(self, status: dict) -> None:
+        _write_atomic(self._file(RESCAN_STATUS_FILENAME), [json.dumps(status).encode("utf-8")])
+
+    def read_status(self) -> Optional[dict]:
+        try:
+            with open(self._file(RESCAN_STATUS_FILENAME), "rb") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+class SharedPlayerState:
+    """PlayerState's fields in a small memory-mapped file all workers use.
+
+    Layout: version (u64), payload length (u32), JSON payload. Every access
+    happens under lock(), an flock on the file (re-entrant within a process,
+    whose threads PlayerState already serialises), and a reader only parses
+    the payload when the version differs from the one it last saw.
+    """
+
+    SIZE = 4096
+    _PREFIX = struct.Struct("<QI")
+
+    def __init__(self, data_dir: str) -> None:
+        if fcntl is None:
+            raise RuntimeError("Shared player state needs fcntl (not available on this platform)")
+        self._fd = os.open(os.path.join(data_dir, PLAYER_FILENAME), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self.SIZE:
+                os.ftruncate(self._fd, self.SIZE)  # zeros: version 0, no payload
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mm = mmap.mmap(self._fd, self.SIZE)
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        with self._depth_lock:
+            self._depth += 1
+            if self._depth == 1:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            with self._depth_lock:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def version(self) -> int:
+        return self._PREFIX.unpack_from(self._mm, 0)[0]
+
+    def read(self) -> Optional[Tuple[int, dict]]:
+        version, length = self._PREFIX.unpack_from(self._mm, 0)
+        if not length:
+            return None
+        start = self._PREFIX.size
+        return version, json.loads(self._mm[start:start + length])
+
+    def write(self, version: int, fields: dict) -> None:
+        data = json.dumps(fields, separators=(",", ":")).encode("utf-8")
+        start = self._PREFIX.size
+        if start + len(data) > self.SIZE:
+            raise ValueError("Player state too large for the shared file")
+        self._mm[start:start + len(data)] = data
+        self._PREFIX.pack_into(self._mm, 0, version, len(data))
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import math
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+
+_M64 = (1 << 64) - 1
+_ROUNDS = 6
+
+
+def _mix(x: int, key: int, mask: int) -> int:
+    # splitmix64 finaliser, keyed per round.
+    x = ((x ^ key) * 0x9E3779B97F4A7C15) & _M64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return (x ^ (x >> 31)) & mask
+
+
+def seed_from_string(seed: str) -> int:
+    """64-bit seed for a client-supplied string, the same in every process.
+
+    (The built-in hash() of a str is salted per process by PYTHONHASHSEED.)
+    """
+    return int.from_bytes(hashlib.blake2b(seed.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class Permutation:
+    """Seeded bijection over [0, n), evaluated one element at a time.
+
+    A balanced Feistel network permutes the smallest even-bit power-of-two
+    domain covering n; results that land outside [0, n) are fed back in
+    (cycle walking) until they fall inside, which keeps it a bijection on
+    [0, n). The domain is under 4n, so that takes a few rounds on average.
+    Element k and the inverse (index) are both O(1) without storing the
+    permutation.
+    """
+
+    __slots__ = ("n", "seed", "_half", "_mask", "_keys")
+
+    def __init__(self, n: int, seed: int) -> None:
+        self.n = n
+        self.seed = seed
+        bits = max(2, (n - 1).bit_length())
+        self._half = (bits + 1) // 2
+        self._mask = (1 << self._half) - 1
+        digest = hashlib.blake2b(seed.to_bytes(16, "little", signed=True), digest_size=8 * _ROUNDS).digest()
+        self._keys: List[int] = [int.from_bytes(digest[i:i + 8], "little") for i in range(0, len(digest), 8)]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _encrypt(self, x: int) -> int:
+        half, mask = self._half, self._mask
+        left, right = x >> half, x & mask
+        for key in self._keys:
+            left, right = right, left ^ _mix(right, key, mask)
+        return (left << half) | right
+
+    def _decrypt(self, x: int) -> int:
+        half, mask = self._half, self._mask
+        left, right = x >> half, x & mask
+        for key in reversed(self._keys):
+            left, right = right ^ _mix(left, key, mask), left
+        return (left << half) | right
+
+    def __getitem__(self, k: int) -> int:
+        if k < 0:
+            k += self.n
+        if not 0 <= k < self.n:
+            raise IndexError(k)
+        x = self._encrypt(k)
+        while x >= self.n:
+            x = self._encrypt(x)
+        return x
+
+    def index(self, value: int) -> int:
+        """Position of value, i.e. the inverse permutation."""
+        if not 0 <= value < self.n:
+            raise ValueError(value)
+        x = self._decrypt(value)
+        while x >= self.n:
+            x = self._decrypt(x)
+        return x
+
+
+class ShuffledRows:
+    """rows in seeded random order, computed per element.
+
+    rows is any indexable sequence of store rows with an index() method
+    (a range or RowRanges); nothing proportional to its length is copied.
+    """
+
+    __slots__ = ("rows", "perm")
+
+    def __init__(self, rows: Sequence[int], seed: int) -> None:
+        self.rows = rows
+        self.perm = Permutation(len(rows), seed)
+
+    def __len__(self) -> int:
+        return self.perm.n
+
+    def __getitem__(self, k: int) -> int:
+        return self.rows[self.perm[k]]
+
+    def __iter__(self) -> Iterator[int]:
+        for k in range(self.perm.n):
+            yield self.rows[self.perm[k]]
+
+    def index(self, row: int) -> int:
+        """Queue position of row; ValueError if it is not in rows."""
+        return self.perm.index(self.rows.index(row))
+
+
+class StableShuffledRows:
+    """rows in seeded random order that survives library changes.
+
+    Each row is ranked by a seeded hash of its track's ID (see
+    TrackStore.id_prefixes()), so the order depends on the seed and the set
+    of tracks, not on row numbers: after a rescan the tracks that were
+    already there keep their relative order, removed ones drop out and
+    added ones land at random places among them. Every process computes
+    the same order from the same seed and library. Unlike ShuffledRows it
+    is built up front: a hash per track and a sort.
+    """
+
+    __slots__ = ("_order", "_positions")
+
+    def __init__(self, rows: Iterable[int], id_prefixes: Sequence[int], seed: int) -> None:
+        key = int.from_bytes(hashlib.blake2b(seed.to_bytes(16, "little", signed=True), digest_size=8).digest(), "little")
+        ranks = [_mix(prefix, key, _M64) for prefix in id_prefixes]
+        self._order = array("I", sorted(rows, key=ranks.__getitem__))
+        positions = array("i", [-1]) * len(ranks)
+        for k, row in enumerate(self._order):
+            positions[row] = k
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __getitem__(self, k: int) -> int:
+        return self._order[k]
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._order)
+
+    def index(self, row: int) -> int:
+        """Queue position of row; ValueError if it is not in rows."""
+        k = self._positions[row] if 0 <= row < len(self._positions) else -1
+        if k < 0:
+            raise ValueError(row)
+        return k
+
+
+def _finite(value: float) -> bool:
+    try:
+        return math.isfinite(value)
+    except OverflowError:  # an int too large for a float
+        return False
+
+
+@dataclass(frozen=True)
+class QueueCursor:
+    """Continuation point in a client's shuffled queue.
+
+    Everything needed to reproduce the shuffle travels with the client, so
+    the server keeps no per-listener state: the permutation seed, the
+    filter, the recent-albums threshold as of the first page (so the track
+    set doesn't drift between pages) and the next position. If the library
+    changes between pages, the shuffle is recomputed over the new library
+    and may repeat or skip a few tracks.
+    """
+
+    seed: int
+    mode: str
+    time_margin_days: int
+    date_type: str
+    threshold: Optional[float]
+    offset: int = 0
+    version: int = 1
+
+    def encode(self) -> str:
+        raw = json.dumps(asdict(self), separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode(cls, token: str) -> "QueueCursor":
+        try:
+            raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+            cursor = cls(**json.loads(raw))
+        except (ValueError, TypeError) as e:
+            raise ValueError("Invalid cursor") from e
+        if (
+            cursor.version != 1
+            or not isinstance(cursor.seed, int)
+            or not 0 <= cursor.seed < 2 ** 64
+            or isinstance(cursor.threshold, bool)
+            or not isinstance(cursor.threshold, (int, float, type(None)))
+            or (cursor.threshold is not None and not _finite(cursor.threshold))
+            or cursor.mode not in ("full_random", "recent_albums")
+            or not isinstance(cursor.time_margin_days, int)
+            or cursor.time_margin_days not in (7, 14, 30, 90)
+            or cursor.date_type not in ("mtime", "btime")
+            or not isinstance(cursor.offset, int)
+            or cursor.offset < 0
+        ):
+            raise ValueError("Invalid cursor")
+        return cursor
@@ -0,0 +1,681 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from functools import cached_property
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .models import Track
+
+if TYPE_CHECKING:
+    from .serialize import TrackJsonEncoder, TrackJsonIndex
+
+
+_ID_BYTES = 20  # SHA1 digest
+_ART_HASH_BYTES = 20  # covers.cover_hash digest
+_NO_INT = -(2 ** 63)
+_NAN = float("nan")
+
+
+class StringTable:
+    """Immutable sequence of strings packed into one UTF-8 blob plus offsets."""
+
+    __slots__ = ("_blob", "_offsets")
+
+    def __init__(self, blob: bytes, offsets: Sequence[int]) -> None:
+        self._blob = blob
+        self._offsets = offsets
+
+    @classmethod
+    def from_strings(cls, values: Iterable[str]) -> "StringTable":
+        parts: List[bytes] = []
+        offsets = array("Q", [0])
+        pos = 0
+        for value in values:
+            data = value.encode("utf-8", "surrogateescape")
+            parts.append(data)
+            pos += len(data)
+            offsets.append(pos)
+        return cls(b"".join(parts), offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8", "surrogateescape")
+
+
+class _DictionaryBuilder:
+    """Assigns small integer codes to repeated values; code 0 means None."""
+
+    def __init__(self) -> None:
+        self._codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def code(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            self.values.append(value)
+            code = self._codes[value] = len(self.values)
+        return code
+
+
+def _opt_float(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def _opt_int(value: int) -> Optional[int]:
+    return None if value == _NO_INT else value
+
+
+def _slot(digest: bytes, mask: int) -> int:
+    # SHA1 output is uniform, so its leading bytes make a fine hash.
+    return int.from_bytes(digest[:8], "little") & mask
+
+
+class RowRanges:
+    """Concatenation of row ranges, indexable like one sequence of rows."""
+
+    __slots__ = ("starts", "stops", "_ends")
+
+    def __init__(self, starts: Sequence[int], stops: Sequence[int]) -> None:
+        self.starts = starts
+        self.stops = stops
+        ends = array("Q")
+        total = 0
+        for start, stop in zip(starts, stops):
+            total += stop - start
+            ends.append(total)
+        self._ends = ends
+
+    def __len__(self) -> int:
+        return self._ends[-1] if self._ends else 0
+
+    def __getitem__(self, k: int) -> int:
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError(k)
+        r = bisect_right(self._ends, k)
+        before = self._ends[r - 1] if r else 0
+        return self.starts[r] + (k - before)
+
+    def __iter__(self) -> Iterator[int]:
+        for start, stop in zip(self.starts, self.stops):
+            yield from range(start, stop)
+
+    def index(self, row: int) -> int:
+        """Position of row; ValueError if no range contains it."""
+        before = 0
+        for start, stop, end in zip(self.starts, self.stops, self._ends):
+            if start <= row < stop:
+                return before + (row - start)
+            before = end
+        raise ValueError(row)
+
+    def to_array(self) -> array:
+        rows = array("I")
+        for start, stop in zip(self.starts, self.stops):
+            rows.extend(range(start, stop))
+        return rows
+
+
+class _BlobBuilder:
+    """StringTable contents being appended to."""
+
+    __slots__ = ("blob", "offsets")
+
+    def __init__(self) -> None:
+        self.blob = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value: str) -> None:
+        self.blob += value.encode("utf-8", "surrogateescape")
+        self.offsets.append(len(self.blob))
+
+    def extend(self, table: StringTable, start: int, stop: int) -> None:
+        """Copy entries [start, stop) of table without decoding them."""
+        offsets = table._offsets
+        first = offsets[start]
+        shift = len(self.blob) - first
+        self.blob += table._blob[first:offsets[stop]]
+        self.offsets.extend([offset + shift for offset in offsets[start + 1:stop + 1]])
+
+
+class TrackStoreBuilder:
+    """Rows of a new TrackStore, added in library order (each folder's rows contiguous).
+
+    add() takes a Track; add_rows() copies rows of another store column by
+    column, without building a Track per row, so a rescan that touched a few
+    folders only pays for those. The result is the same store from_tracks()
+    would build from the same tracks.
+    """
+
+    def __init__(self) -> None:
+        self._ids = bytearray()
+        self._folder = array("I")
+        self._filenames = _BlobBuilder()
+        self._titles = _BlobBuilder()
+        self._ext = array("I")
+        self._artist = array("I")
+        self._album = array("I")
+        self._duration = array("d")
+        self._track_number = array("q")
+        self._file_size = array("q")
+        self._file_mtime = array("d")
+        self._file_inode = array("Q")
+        self._art_offset = array("q")
+        self._art_size = array("q")
+        self._art_mime = array("I")
+        self._art_hashes = bytearray()
+
+        self._folder_codes: Dict[str, int] = {}
+        self._folder_start = array("I")
+        self._folder_paths = _BlobBuilder()
+        self._folder_mtime = array("d")
+        self._folder_btime = array("d")
+        self._folder_cover = array("I")
+
+        self._exts = _DictionaryBuilder()
+        self._artists = _DictionaryBuilder()
+        self._albums = _DictionaryBuilder()
+        self._covers = _DictionaryBuilder()
+        self._art_mimes = _DictionaryBuilder()
+
+        # Dictionary codes of the store add_rows() last copied from, mapped to ours.
+        self._recode_source: Optional["TrackStore"] = None
+        self._recodes: Dict[str, Dict[int, int]] = {}
+        # While every row so far is rows 0..n of one store, in order, that store.
+        self._copy_of: Optional["TrackStore"] = None
+        self._only_copies = True
+
+    def __len__(self) -> int:
+        return len(self._folder)
+
+    def _folder_code(self, path: str) -> Tuple[int, bool]:
+        """Code of folder path, and whether it is new (its folder-level values still to be appended)."""
+        f = self._folder_codes.get(path)
+        if f is None:
+            f = self._folder_codes[path] = len(self._folder_start)
+            self._folder_start.append(len(self._folder))
+            self._folder_paths.append(path)
+            return f, True
+        if f != len(self._folder_start) - 1:
+            raise ValueError(f"Tracks of folder {path!r} are not contiguous")
+        return f, False
+
+    def add(self, t: Track) -> None:
+        self._only_copies = False
+        f, new = self._folder_code(t.folder)
+        if new:
+            self._folder_mtime.append(_NAN if t.folder_mtime is None else t.folder_mtime)
+            self._folder_btime.append(_NAN if t.folder_btime is None else t.folder_btime)
+            self._folder_cover.append(self._covers.code(t.cover_rel_path))
+
+        self._ids += bytes.fromhex(t.id)
+        self._folder.append(f)
+        self._filenames.append(t.filename)
+        self._titles.append(t.title or "")
+        self._ext.append(self._exts.code(t.ext))
+        self._artist.append(self._artists.code(t.artist))
+        self._album.append(self._albums.code(t.album))
+        self._duration.append(_NAN if t.duration is None else t.duration)
+        self._track_number.append(_NO_INT if t.track_number is None else t.track_number)
+        self._file_size.append(_NO_INT if t.file_size is None else t.file_size)
+        self._file_mtime.append(_NAN if t.file_mtime is None else t.file_mtime)
+        self._file_inode.append(t.file_inode or 0)  # inode 0 is never a real file
+        self._art_offset.append(_NO_INT if t.art_offset is None else t.art_offset)
+        self._art_size.append(_NO_INT if t.art_size is None else t.art_size)
+        self._art_mime.append(self._art_mimes.code(t.art_mime))
+        self._art_hashes += bytes.fromhex(t.art_hash) if t.art_hash else bytes(_ART_HASH_BYTES)
+
+    def add_rows(self, store: "TrackStore", start: int, stop: int) -> None:
+        """Append rows [start, stop) of store, which may span several folders."""
+        if start >= stop:
+            return
+        self._only_copies = (
+            self._only_copies and start == len(self) and (self._copy_of is None or self._copy_of is store)
+        )
+        self._copy_of = store
+        if self._recode_source is not store:
+            self._recode_source = store
+            self._recodes = {name: {0: 0} for name in ("ext", "artist", "album", "art_mime", "cover")}
+        recodes = self._recodes
+
+        pos = start
+        while pos < stop:
+            sf = store._folder[pos]
+            end = min(stop, store._folder_start[sf + 1])
+            f, new = self._folder_code(store._folder_paths[sf])
+            if new:
+                self._folder_mtime.append(store._folder_mtime[sf])
+                self._folder_btime.append(store._folder_btime[sf])
+                self._folder_cover.extend(self._recode(recodes["cover"], [store._folder_cover[sf]], store._covers, self._covers))
+            self._folder.extend(array("I", [f]) * (end - pos))
+            pos = end
+
+        self._ids += store._ids[start * _ID_BYTES:stop * _ID_BYTES]
+        self._filenames.extend(store._filenames, start, stop)
+        self._titles.extend(store._titles, start, stop)
+        self._ext.extend(self._recode(recodes["ext"], store._ext[start:stop], store._exts, self._exts))
+        self._artist.extend(self._recode(recodes["artist"], store._artist[start:stop], store._artists, self._artists))
+        self._album.extend(self._recode(recodes["album"], store._album[start:stop], store._albums, self._albums))
+        self._duration.extend(store._duration[start:stop])
+        self._track_number.extend(store._track_number[start:stop])
+        self._file_size.extend(store._file_size[start:stop])
+        self._file_mtime.extend(store._file_mtime[start:stop])
+        self._file_inode.extend(store._file_inode[start:stop])
+        self._art_offset.extend(store._art_offset[start:stop])
+        self._art_size.extend(store._art_size[start:stop])
+        self._art_mime.extend(self._recode(recodes["art_mime"], store._art_mime[start:stop], store._art_mimes, self._art_mimes))
+        self._art_hashes += store._art_hashes[start * _ART_HASH_BYTES:stop * _ART_HASH_BYTES]
+
+    @staticmethod
+    def _recode(recode: Dict[int, int], codes: Iterable[int], values: StringTable, builder: _DictionaryBuilder) -> List[int]:
+        out = []
+        for code in codes:
+            new = recode.get(code)
+            if new is None:
+                new = recode[code] = builder.code(values[code - 1])
+            out.append(new)
+        return out
+
+    def copies(self, store: "TrackStore") -> bool:
+        """Whether the rows added so far are exactly store's, in order (build() would equal it)."""
+        return self._only_copies and self._copy_of is store and len(self) == len(store)
+
+    def build(self) -> "TrackStore":
+        n = len(self._folder)
+        folder_start = array("I", self._folder_start)
+        folder_start.append(n)
+        size = 8
+        while size < 2 * n:
+            size *= 2
+        id_slots = array("q", [-1]) * size
+        mask = size - 1
+        ids = bytes(self._ids)
+        for i in range(n):
+            slot = _slot(ids[i * _ID_BYTES:(i + 1) * _ID_BYTES], mask)
+            while id_slots[slot] != -1:
+                slot = (slot + 1) & mask
+            id_slots[slot] = i
+
+        columns: Dict[str, Sequence] = {
+            "ids": ids,
+            "id_slots": id_slots,
+            "folder": array("I", self._folder),
+            "ext": array("I", self._ext),
+            "artist": array("I", self._artist),
+            "album": array("I", self._album),
+            "duration": array("d", self._duration),
+            "track_number": array("q", self._track_number),
+            "file_size": array("q", self._file_size),
+            "file_mtime": array("d", self._file_mtime),
+            "file_inode": array("Q", self._file_inode),
+            "art_offset": array("q", self._art_offset),
+            "art_size": array("q", self._art_size),
+            "art_mime": array("I", self._art_mime),
+            "art_hashes": bytes(self._art_hashes),
+            "folder_start": folder_start,
+            "folder_mtime": array("d", self._folder_mtime),
+            "folder_btime": array("d", self._folder_btime),
+            "folder_cover": array("I", self._folder_cover),
+        }
+        for blob_name, offsets_name, table in (
+            ("filenames", "filename_offsets", self._filenames),
+            ("titles", "title_offsets", self._titles),
+            ("folder_paths", "folder_path_offsets", self._folder_paths),
+        ):
+            columns[blob_name] = bytes(table.blob)
+            columns[offsets_name] = array("Q", table.offsets)
+        for name, values in (
+            ("ext", self._exts.values),
+            ("artist", self._artists.values),
+            ("album", self._albums.values),
+            ("cover", self._covers.values),
+            ("art_mime", self._art_mimes.values),
+        ):
+            table = StringTable.from_strings(values)
+            columns[f"{name}s"] = table._blob
+            columns[f"{name}_offsets"] = table._offsets
+        return TrackStore(columns)
+
+
+class TrackStore(Mapping):
+    """Read-only, column-oriented track table in library order.
+
+    Every track is a row index. IDs are packed 20-byte digests with an
+    open-addressing hash table for ID -> row lookups; per-track strings
+    (filename, title) live in packed string tables; artist, album, ext and
+    everything folder-level (path, dates, cover) are dictionary-encoded.
+    Numeric fields are typed arrays with NaN / a sentinel for missing values.
+    Track objects are only built on demand as views of a row.
+
+    Rows of a folder are contiguous, so a folder is a row range.
+
+    Acts as a Mapping[str, Track] keyed by hex track ID, iterating in
+    library order, so it can stand in wherever a dict of tracks was used.
+    """
+
+    # Buffers that make up a store; see to_buffers()/from_buffers().
+    COLUMNS = {
+        "ids": None,
+        "id_slots": "q",
+        "folder": "I",
+        "filenames": None,
+        "filename_offsets": "Q",
+        "titles": None,
+        "title_offsets": "Q",
+        "ext": "I",
+        "artist": "I",
+        "album": "I",
+        "duration": "d",
+        "track_number": "q",
+        "file_size": "q",
+        "file_mtime": "d",
+        "file_inode": "Q",
+        "art_offset": "q",
+        "art_size": "q",
+        "art_mime": "I",
+        "art_hashes": None,
+        "folder_start": "I",
+        "folder_paths": None,
+        "folder_path_offsets": "Q",
+        "folder_mtime": "d",
+        "folder_btime": "d",
+        "folder_cover": "I",
+        "exts": None,
+        "ext_offsets": "Q",
+        "artists": None,
+        "artist_offsets": "Q",
+        "albums": None,
+        "album_offsets": "Q",
+        "covers": None,
+        "cover_offsets": "Q",
+        "art_mimes": None,
+        "art_mime_offsets": "Q",
+    }
+
+    def __init__(self, columns: Dict[str, Sequence]) -> None:
+        self._ids: bytes = columns["ids"]
+        self._id_slots: Sequence[int] = columns["id_slots"]
+        self._folder: Sequence[int] = columns["folder"]
+        self._filenames = StringTable(columns["filenames"], columns["filename_offsets"])
+        self._titles = StringTable(columns["titles"], columns["title_offsets"])
+        self._ext: Sequence[int] = columns["ext"]
+        self._artist: Sequence[int] = columns["artist"]
+        self._album: Sequence[int] = columns["album"]
+        self._duration: Sequence[float] = columns["duration"]
+        self._track_number: Sequence[int] = columns["track_number"]
+        self._file_size: Sequence[int] = columns["file_size"]
+        self._file_mtime: Sequence[float] = columns["file_mtime"]
+        self._file_inode: Sequence[int] = columns["file_inode"]
+        self._art_offset: Sequence[int] = columns["art_offset"]
+        self._art_size: Sequence[int] = columns["art_size"]
+        self._art_mime: Sequence[int] = columns["art_mime"]
+        self._art_hashes: bytes = columns["art_hashes"]
+        self._folder_start: Sequence[int] = columns["folder_start"]
+        self._folder_paths = StringTable(columns["folder_paths"], columns["folder_path_offsets"])
+        self._folder_mtime: Sequence[float] = columns["folder_mtime"]
+        self._folder_btime: Sequence[float] = columns["folder_btime"]
+        self._folder_cover: Sequence[int] = columns["folder_cover"]
+        self._exts = StringTable(columns["exts"], columns["ext_offsets"])
+        self._artists = StringTable(columns["artists"], columns["artist_offsets"])
+        self._albums = StringTable(columns["albums"], columns["album_offsets"])
+        self._covers = StringTable(columns["covers"], columns["cover_offsets"])
+        self._art_mimes = StringTable(columns["art_mimes"], columns["art_mime_offsets"])
+        self._columns = columns
+        self._n = len(self._folder)
+        self._mask = len(self._id_slots) - 1
+        self._json_index: Optional["TrackJsonIndex"] = None
+        self._json_index_lock = threading.Lock()
+
+    # construction ----------------------------------------------------------
+
+    @classmethod
+    def from_tracks(cls, tracks: Iterable[Track]) -> "TrackStore":
+        """Build a store from tracks in library order (folders contiguous)."""
+        builder = TrackStoreBuilder()
+        for t in tracks:
+            builder.add(t)
+        return builder.build()
+
+    @classmethod
+    def empty(cls) -> "TrackStore":
+        return cls.from_tracks([])
+
+    def to_buffers(self) -> Dict[str, bytes]:
+        return {name: bytes(self._columns[name]) if typecode is None else self._columns[name].tobytes()
+                for name, typecode in self.COLUMNS.items()}
+
+    @classmethod
+    def from_buffers(cls, buffers: Dict[str, bytes]) -> "TrackStore":
+        columns: Dict[str, Sequence] = {}
+        for name, typecode in cls.COLUMNS.items():
+            if typecode is None:
+                columns[name] = buffers[name]
+            else:
+                values = array(typecode)
+                values.frombytes(buffers[name])
+                columns[name] = values
+        return cls(columns)
+
+    @classmethod
+    def from_views(cls, views: Dict[str, memoryview]) -> "TrackStore":
+        """Store over byte views (e.g. of an mmap) in to_buffers() layout, without copying.
+
+        The views must stay valid for the life of the store.
+        """
+        return cls({name: views[name] if typecode is None else views[name].cast(typecode)
+                    for name, typecode in cls.COLUMNS.items()})
+
+    def column_views(self) -> Dict[str, memoryview]:
+        """Byte views of the columns, in to_buffers() layout."""
+        return {name: memoryview(self._columns[name]).cast("B") for name in self.COLUMNS}
+
+    # lookups ---------------------------------------------------------------
+
+    def index_of(self, track_id: str) -> int:
+        """Row of track_id, or -1."""
+        if len(track_id) != 2 * _ID_BYTES:
+            return -1
+        try:
+            digest = bytes.fromhex(track_id)
+        except ValueError:
+            return -1
+        ids = self._ids
+        slot = _slot(digest, self._mask)
+        while True:
+            i = self._id_slots[slot]
+            if i == -1:
+                return -1
+            if ids[i * _ID_BYTES:(i + 1) * _ID_BYTES] == digest:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def id_at(self, i: int) -> str:
+        return bytes(self._ids[i * _ID_BYTES:(i + 1) * _ID_BYTES]).hex()
+
+    def track(self, i: int) -> Track:
+        f = self._folder[i]
+        folder = self._folder_paths[f]
+        filename = self._filenames[i]
+        ext = self._ext[i]
+        artist = self._artist[i]
+        album = self._album[i]
+        cover = self._folder_cover[f]
+        art_mime = self._art_mime[i]
+        art_hash = bytes(self._art_hashes[i * _ART_HASH_BYTES:(i + 1) * _ART_HASH_BYTES])  # zeros: not hashed
+        return Track(
+            id=self.id_at(i),
+            rel_path=os.path.join(folder, filename) if folder else filename,
+            filename=filename,
+            folder=folder,
+            ext=self._exts[ext - 1] if ext else None,
+            cover_rel_path=self._covers[cover - 1] if cover else None,
+            artist=self._artists[artist - 1] if artist else None,
+            album=self._albums[album - 1] if album else None,
+            title=self._titles[i],
+            duration=_opt_float(self._duration[i]),
+            track_number=_opt_int(self._track_number[i]),
+            folder_mtime=_opt_float(self._folder_mtime[f]),
+            folder_btime=_opt_float(self._folder_btime[f]),
+            file_size=_opt_int(self._file_size[i]),
+            file_mtime=_opt_float(self._file_mtime[i]),
+            file_inode=self._file_inode[i] or None,
+            art_offset=_opt_int(self._art_offset[i]),
+            art_size=_opt_int(self._art_size[i]),
+            art_mime=self._art_mimes[art_mime - 1] if art_mime else None,
+            art_hash=art_hash.hex() if any(art_hash) else None,
+        )
+
+    def folder_of(self, i: int) -> int:
+        return self._folder[i]
+
+    def folder_path(self, f: int) -> str:
+        return self._folder_paths[f]
+
+    def folder_date(self, f: int, date_type: str) -> Optional[float]:
+        """Folder mtime or btime, or None if unknown."""
+        values = self._folder_mtime if date_type == "mtime" else self._folder_btime
+        return _opt_float(values[f])
+
+    def folder_index(self, path: str) -> int:
+        """Folder code of path, or -1."""
+        return self._folder_index.get(path, -1)
+
+    @cached_property
+    def _folder_index(self) -> Dict[str, int]:
+        return {self._folder_paths[f]: f for f in range(self.folder_count)}
+
+    def id_bytes(self, start: int, stop: int) -> bytes:
+        """Packed 20-byte digests of rows [start, stop)."""
+        return bytes(self._ids[start * _ID_BYTES:stop * _ID_BYTES])
+
+    def id_prefixes(self) -> List[int]:
+        """First 8 bytes of every row's digest, as ints in row order (stable per track)."""
+        return [prefix for (prefix,) in struct.iter_unpack(f"<Q{_ID_BYTES - 8}x", self._ids)]
+
+    def folder_rows(self, f: int) -> range:
+        return range(self._folder_start[f], self._folder_start[f + 1])
+
+    @property
+    def folder_count(self) -> int:
+        return len(self._folder_mtime)
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Content hash of the store: equal libraries give equal fingerprints,
+        in any process, so it works as an HTTP validator."""
+        digest = hashlib.blake2b(digest_size=12)
+        for name in self.COLUMNS:
+            data = memoryview(self._columns[name]).cast("B")
+            digest.update(len(data).to_bytes(8, "little"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    @cached_property
+    def folder_dates(self) -> "FolderDateIndex":
+        """Date index over this store's folders, built on first use.
+
+        A rescan produces a new store, which takes the index with it.
+        """
+        return FolderDateIndex(self)
+
+    @property
+    def json_index(self) -> Union["TrackJsonIndex", "TrackJsonEncoder"]:
+        """Pre-encoded JSON fields of every track, or until warm() has built
+        them, an encoder with the same interface that encodes rows as asked."""
+        index = self._json_index
+        if index is None:
+            from .serialize import TrackJsonEncoder
+
+            return TrackJsonEncoder(self)
+        return index
+
+    def full_json_index(self) -> "TrackJsonIndex":
+        """The pre-encoded JSON index, built now if it isn't yet."""
+        with self._json_index_lock:
+            if self._json_index is None:
+                from .serialize import TrackJsonIndex
+
+                self._json_index = TrackJsonIndex(self)
+            return self._json_index
+
+    def use_json_index(self, index: "TrackJsonIndex") -> None:
+        """Adopt an index built elsewhere (e.g. mapped from another process) instead of building one."""
+        self._json_index = index
+
+    def warm(self, on_json_index: Optional[Callable[["TrackStore"], None]] = None) -> None:
+        """Build the derived indexes before the store is published, so no reader pays for them.
+
+        The date index and fingerprint are built here. The JSON index takes
+        seconds on a large library, so a background thread builds it, and
+        on_json_index(store) is called from there once it is ready (even if
+        it already was), never from the caller's thread.
+        """
+        self.folder_dates
+        self.fingerprint
+        if self._json_index is None or on_json_index is not None:
+            threading.Thread(target=self._warm_json_index, args=(on_json_index,), name="json-index", daemon=True).start()
+
+    def _warm_json_index(self, on_json_index: Optional[Callable[["TrackStore"], None]]) -> None:
+        self.full_json_index()
+        if on_json_index is not None:
+            on_json_index(self)
+
+    # Mapping ---------------------------------------------------------------
+
+    def __getitem__(self, track_id: str) -> Track:
+        i = self.index_of(track_id)
+        if i < 0:
+            raise KeyError(track_id)
+        return self.track(i)
+
+    def __contains__(self, track_id: object) -> bool:
+        return isinstance(track_id, str) and self.index_of(track_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield self.id_at(i)
+
+    def __len__(self) -> int:
+        return self._n
+
+
+class FolderDateIndex:
+    """Folders of a store sorted by mtime and by btime.
+
+    Each order keeps the folders' dates alongside their row ranges; folders
+    without a date are left out. "Folders dated at or after a threshold" is
+    then a bisect followed by array slices, without touching any track.
+    """
+
+    def __init__(self, store: TrackStore) -> None:
+        self._orders: Dict[str, Tuple[array, array, array]] = {}
+        for date_type in ("mtime", "btime"):
+            dated = sorted(
+                (date, f)
+                for f, date in ((f, store.folder_date(f, date_type)) for f in range(store.folder_count))
+                if date  # 0 / None mean unknown, as in the player's filter
+            )
+            rows = [store.folder_rows(f) for _, f in dated]
+            self._orders[date_type] = (
+                array("d", (date for date, _ in dated)),
+                array("I", (r.start for r in rows)),
+                array("I", (r.stop for r in rows)),
+            )
+
+    def since(self, date_type: str, threshold: float) -> RowRanges:
+        """Rows of every folder whose date_type date is >= threshold."""
+        dates, starts, stops = self._orders[date_type]
+        i = bisect_left(dates, threshold)
+        return RowRanges(starts[i:], stops[i:])
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import Receive, Scope, Send
+
+
+# Bytes per read; larger than Starlette's 64 KB so long transfers take
+# fewer thread hand-offs.
+CHUNK_SIZE = 256 * 1024
+# How far ahead of the current position the kernel is asked to read.
+READ_AHEAD = 2 * 1024 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_active = 0
+
+
+def active_streams() -> int:
+    """Audio responses currently being sent."""
+    return _active
+
+
+def _fadvise(fd: int, offset: int, length: int, advice_name: str) -> None:
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return  # not available on this platform
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+
+
+def file_etag(size: int, mtime: float, inode: Optional[int]) -> str:
+    """Strong validator for an audio file from its size, mtime and inode."""
+    return f'"{size:x}-{int(mtime * 1_000_000):x}-{inode or 0:x}"'
+
+
+def parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """[start, end) of a single "bytes=" range; None to ignore the header.
+
+    Raises ValueError when the range can't be satisfied. Multiple ranges
+    are ignored (the whole file is sent), which RFC 9110 allows.
+    """
+    match = _RANGE.match(value.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(0, size - int(last)), size  # suffix: last N bytes
+    else:
+        start = int(first)
+        end = min(size, int(last) + 1) if last else size
+        if last and int(last) < start:
+            return None
+    if start >= size or start >= end:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+class AudioFileResponse(Response):
+    """Sends an audio file, or one byte range of it.
+
+    Validators come from the stat recorded by the library scan, so
+    conditional requests (If-None-Match, If-Modified-Since) are answered
+    without touching the disk; a file that changed since the scan is
+    detected with fstat on the open descriptor and described by its real
+    stat instead. Range and If-Range follow RFC 9110 for a single range.
+
+    The body goes out in CHUNK_SIZE preads on a worker thread, with the
+    kernel told the access is sequential and asked to read ahead of the
+    current position.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        size: Optional[int],
+        mtime: Optional[float],
+        inode: Optional[int] = None,
+        media_type: str,
+        filename: Optional[str] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.inode = inode
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+        if filename is not None:
+            self.headers.setdefault("content-disposition", _content_disposition(filename))
+
+    def _validators(self, size: int, mtime: float, inode: Optional[int]) -> Tuple[str, str]:
+        return file_etag(size, mtime, inode), formatdate(mtime, usegmt=True)
+
+    def _not_modified(self, request: Headers, etag: str, mtime: float) -> bool:
+        if_none_match = request.get("if-none-match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        if_modified_since = request.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _range_applies(self, request: Headers, etag: str, last_modified: str) -> bool:
+        if_range = request.get("if-range")
+        if if_range is None:
+            return True
+        if_range = if_range.strip()
+        # Strong comparison only: a weak tag or another date means "send it all".
+        return if_range == etag or if_range == last_modified
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global _active
+        request = Headers(scope=scope)
+
+        if self.size is not None and self.mtime is not None:
+            etag, last_modified = self._validators(self.size, self.mtime, self.inode)
+            if self._not_modified(request, etag, self.mtime):
+                await self._send_not_modified(send, etag, last_modified)
+                return
+
+        try:
+            fd = os.open(self.path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        except OSError:
+            await JSONResponse({"detail": "File missing"}, status_code=404)(scope, receive, send)
+            return
+        _active += 1
+        try:
+            st = os.fstat(fd)
+            if (st.st_size, st.st_mtime, self.inode or st.st_ino) != (self.size, self.mtime, st.st_ino):
+                # Changed since the scan (or not indexed): describe the real file.
+                etag, last_modified = self._validators(st.st_size, st.st_mtime, st.st_ino)
+                if self._not_modified(request, etag, st.st_mtime):
+                    await self._send_not_modified(send, etag, last_modified)
+                    return
+            size = st.st_size
+            self.headers["etag"] = etag
+            self.headers["last-modified"] = last_modified
+
+            start, end = 0, size
+            http_range = request.get("range")
+            if http_range is not None and self._range_applies(request, etag, last_modified):
+                try:
+                    byte_range = parse_range(http_range, size)
+                except ValueError:
+                    response = Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+                    await response(scope, receive, send)
+                    return
+                if byte_range is not None:
+                    start, end = byte_range
+                    self.status_code = 206
+                    self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            self.headers["content-length"] = str(end - start)
+
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"].upper() == "HEAD" or start == end:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            _fadvise(fd, start, end - start, "POSIX_FADV_SEQUENTIAL")
+            await self._send_chunks(send, fd, start, end)
+        finally:
+            _active -= 1
+            os.close(fd)
+
+    async def _send_chunks(self, send: Send, fd: int, start: int, end: int) -> None:
+        position = start
+        advised = start
+        while position < end:
+            if position >= advised - READ_AHEAD // 2:
+                # Keep READ_AHEAD bytes requested ahead of what is being sent.
+                _fadvise(fd, advised, min(READ_AHEAD, end - advised), "POSIX_FADV_WILLNEED")
+                advised = min(end, advised + READ_AHEAD)
+            chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, end - position), position)
+            if not chunk:
+                # Truncated underneath us. Content-Length is already out, so
+                # ending normally would pass a short body off as complete:
+                # fail instead, and the server drops the connection.
+                raise OSError(f"{self.path} shrank to {position} bytes while being sent")
+            position += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": position < end})
+
+    async def _send_not_modified(self, send: Send, etag: str, last_modified: str) -> None:
+        headers = Response(status_code=304, headers={"etag": etag, "last-modified": last_modified, "accept-ranges": "bytes"})
+        await send({"type": "http.response.start", "status": 304, "headers": headers.raw_headers})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _content_disposition(filename: str) -> str:
+    # As FileResponse writes it, so clients see the same headers as before.
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
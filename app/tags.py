@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import io
+import re
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+from mutagen.id3 import ParseID3v1
+from mutagen.mp3 import MPEGInfo
+
+
+# Largest tag structure read in full (a text frame or VORBIS_COMMENT block).
+# Anything bigger, and every picture payload, is seeked over.
+MAX_TAG_BYTES = 1024 * 1024
+# Read-ahead for the header region; typical tags fit in one read.
+HEADER_BUFFER = 16 * 1024
+
+_ID3_FRAMES = {"TPE1": "artist", "TALB": "album", "TIT2": "title", "TRCK": "tracknumber"}
+_VORBIS_KEYS = ("artist", "album", "title", "tracknumber")
+_FRAME_ID = re.compile(rb"^[A-Z0-9]{4}$")
+_TEXT_ENCODINGS = {0: ("latin1", b"\x00"), 1: ("utf-16", b"\x00\x00"), 2: ("utf-16-be", b"\x00\x00"), 3: ("utf-8", b"\x00")}
+
+
+class HeaderTags(NamedTuple):
+    """The fields the library keeps, read from the start of an audio file."""
+    tags: Dict[str, str]  # artist, album, title, tracknumber when present
+    length: Optional[float]
+    art_offset: Optional[int]  # first picture: offset of its bytes ...
+    art_size: int  # ... their length (0 = no picture) ...
+    art_mime: Optional[str]  # ... and MIME type
+    bytes_read: int
+
+
+class _Unsupported(Exception):
+    """Something the partial reader doesn't handle; parse with mutagen instead."""
+
+
+class CountingFile(io.FileIO):
+    """Raw file that counts the bytes actually read from the OS."""
+
+    bytes_read = 0
+
+    def readinto(self, b) -> Optional[int]:
+        n = super().readinto(b)
+        if n:
+            self.bytes_read += n
+        return n
+
+
+def open_counting(path: str) -> Tuple[CountingFile, BinaryIO]:
+    raw = CountingFile(path, "rb")
+    return raw, io.BufferedReader(raw, HEADER_BUFFER)
+
+
+def _syncsafe(b: bytes) -> int:
+    if any(x & 0x80 for x in b):
+        raise _Unsupported("not a syncsafe integer")
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _read_exact(f: BinaryIO, n: int) -> bytes:
+    if n > MAX_TAG_BYTES:
+        raise _Unsupported("tag structure too large")
+    data = f.read(n)
+    if len(data) != n:
+        raise _Unsupported("truncated")
+    return data
+
+
+def _split_text(data: bytes, terminator: bytes) -> bytes:
+    # First value of a null-separated list; UTF-16 terminators are aligned.
+    step = len(terminator)
+    i = data.find(terminator)
+    while i != -1 and i % step:
+        i = data.find(terminator, i + 1)
+    return data if i == -1 else data[:i]
+
+
+def _text_frame(data: bytes) -> Optional[str]:
+    if not data:
+        return None
+    encoding, terminator = _TEXT_ENCODINGS.get(data[0], (None, None))
+    if encoding is None:
+        raise _Unsupported("unknown text encoding")
+    if len(data) == 1:
+        return None
+    return _split_text(data[1:], terminator).decode(encoding)
+
+
+def _apic_header(data: bytes) -> Tuple[str, int]:
+    # encoding, MIME type (latin1, NUL), picture type, description (NUL), data
+    encoding, terminator = _TEXT_ENCODINGS.get(data[0], (None, None))
+    if encoding is None:
+        raise _Unsupported("unknown text encoding")
+    mime_end = data.index(b"\x00", 1)
+    mime = data[1:mime_end].decode("latin1")
+    desc_start = mime_end + 2
+    desc = _split_text(data[desc_start:], terminator)
+    if len(desc) == len(data) - desc_start:
+        raise _Unsupported("APIC description not terminated in the header read")
+    return mime, desc_start + len(desc) + len(terminator)
+
+
+def _read_id3(f: BinaryIO, header: bytes) -> Tuple[Dict[str, str], int, Optional[int], int, Optional[str]]:
+    """Text frames and first APIC of an ID3v2.3/2.4 tag at the start of f."""
+    major, flags = header[3], header[5]
+    if major not in (3, 4) or flags & 0x80:
+        raise _Unsupported("ID3v2.2 or unsynchronised tag")
+    tag_end = 10 + _syncsafe(header[6:10])
+    pos = 10
+    if flags & 0x40:
+        # Extended header: v2.4 size includes itself, v2.3 size doesn't.
+        size = f.read(4)
+        pos += _syncsafe(size) if major == 4 else 4 + int.from_bytes(size, "big")
+    tags: Dict[str, str] = {}
+    art_offset, art_size, art_mime = None, 0, None
+    while pos + 10 <= tag_end:
+        f.seek(pos)
+        frame = f.read(10)
+        frame_id = frame[:4]
+        if not _FRAME_ID.match(frame_id):
+            break  # padding
+        size = _syncsafe(frame[4:8]) if major == 4 else int.from_bytes(frame[4:8], "big")
+        body = pos + 10
+        pos = body + size
+        if pos > tag_end:
+            raise _Unsupported("frame overruns the tag")
+        name = frame_id.decode("ascii")
+        if name not in _ID3_FRAMES and (name != "APIC" or art_size):
+            continue
+        frame_flags = frame[9]
+        if major == 4:
+            if frame_flags & 0x0E:
+                raise _Unsupported("compressed, encrypted or unsynchronised frame")
+            skip = (1 if frame_flags & 0x40 else 0) + (4 if frame_flags & 0x01 else 0)
+        else:
+            if frame_flags & 0xC0:
+                raise _Unsupported("compressed or encrypted frame")
+            skip = 1 if frame_flags & 0x20 else 0
+        f.seek(body + skip)
+        if name == "APIC":
+            mime, data_start = _apic_header(f.read(min(size - skip, 4096)))
+            art_offset, art_size, art_mime = body + skip + data_start, size - skip - data_start, mime
+        elif _ID3_FRAMES[name] not in tags:
+            value = _text_frame(_read_exact(f, size - skip))
+            if value is not None:
+                tags[_ID3_FRAMES[name]] = value
+    return tags, tag_end, art_offset, art_size, art_mime
+
+
+def _read_mp3(f: BinaryIO) -> HeaderTags:
+    header = f.read(10)
+    tags: Dict[str, str] = {}
+    art_offset, art_size, art_mime = None, 0, None
+    offset = None
+    if header[:3] == b"ID3" and len(header) == 10:
+        tags, offset, art_offset, art_size, art_mime = _read_id3(f, header)
+
+    # mutagen fills frames missing from ID3v2 from an ID3v1 tag at the end.
+    if len(tags) < len(_ID3_FRAMES):
+        f.seek(0, 2)
+        f.seek(max(0, f.tell() - 131))
+        tail = f.read(131)
+        idx = tail.find(b"TAG")
+        if idx != -1 and not (idx >= 5 and tail[idx - 5:idx + 3] == b"APETAGEX"):
+            for frame in (ParseID3v1(tail[idx:]) or {}).values():
+                key = _ID3_FRAMES.get(frame.FrameID)
+                if key is not None and key not in tags:
+                    tags[key] = str(frame.text[0])
+
+    # Length from the first MPEG frames (Xing/VBRI header or bitrate and file
+    # size), as mutagen computes it.
+    info = MPEGInfo(f, offset)
+    return HeaderTags(tags, info.length, art_offset, art_size, art_mime, 0)
+
+
+def _read_flac(f: BinaryIO) -> HeaderTags:
+    tags: Dict[str, str] = {}
+    length = None
+    art_offset, art_size, art_mime = None, 0, None
+    seen_comment = False
+    while True:
+        block = f.read(4)
+        if len(block) < 4:
+            raise _Unsupported("truncated metadata")
+        block_type = block[0] & 0x7F
+        size = int.from_bytes(block[1:4], "big")
+        start = f.tell()
+        if block_type == 0:
+            data = _read_exact(f, size)
+            sample_rate = int.from_bytes(data[10:13], "big") >> 4
+            total_samples = int.from_bytes(data[13:18], "big") & 0xFFFFFFFFF
+            if not sample_rate:
+                raise _Unsupported("sample rate 0")
+            length = total_samples / float(sample_rate)
+        elif block_type == 4:
+            if seen_comment:
+                raise _Unsupported("more than one VORBIS_COMMENT block")  # mutagen rejects these
+            seen_comment = True
+            data = _read_exact(f, size)
+            vendor = int.from_bytes(data[0:4], "little")
+            pos = 4 + vendor
+            count = int.from_bytes(data[pos:pos + 4], "little")
+            pos += 4
+            for _ in range(count):
+                n = int.from_bytes(data[pos:pos + 4], "little")
+                comment = data[pos + 4:pos + 4 + n].decode("utf-8", "replace")
+                pos += 4 + n
+                key, sep, value = comment.partition("=")
+                key = key.lower()
+                if sep and key in _VORBIS_KEYS and key not in tags:
+                    tags[key] = value
+        elif block_type == 6 and not art_size:
+            head = f.read(8)
+            mime = _read_exact(f, int.from_bytes(head[4:8], "big")).decode("utf-8", "replace")
+            f.seek(int.from_bytes(f.read(4), "big") + 16, 1)
+            data_size = int.from_bytes(f.read(4), "big")
+            art_offset, art_size, art_mime = f.tell(), data_size, mime
+        if block[0] & 0x80:
+            break
+        f.seek(start + size)
+    return HeaderTags(tags, length, art_offset, art_size, art_mime, 0)
+
+
+def read_header_tags(path: str) -> Optional[HeaderTags]:
+    """Tags, length and picture location from the header region of path.
+
+    Reads an ID3v2 tag (text frames only; pictures are located, not read)
+    or FLAC STREAMINFO and VORBIS_COMMENT, plus the first MPEG frames or an
+    ID3v1 tag for MP3s, in bounded reads. Returns None for anything it
+    doesn't handle (ID3v2.2, unsynchronisation, compressed frames, oversized
+    tags), which callers parse with mutagen as before.
+    """
+    raw, f = open_counting(path)
+    try:
+        header = f.read(4)
+        if header[:3] == b"ID3":
+            # FLAC files occasionally carry an ID3v2 tag in front.
+            f.seek(6)
+            skip = 10 + _syncsafe(f.read(4))
+            f.seek(skip)
+            if f.read(4) == b"fLaC":
+                result = _read_flac(f)
+            else:
+                f.seek(0)
+                result = _read_mp3(f)
+        elif header == b"fLaC":
+            result = _read_flac(f)
+        elif path.lower().endswith(".mp3"):
+            f.seek(0)
+            result = _read_mp3(f)
+        else:
+            return None
+    except Exception:
+        return None
+    finally:
+        f.close()
+    return result._replace(bytes_read=raw.bytes_read)
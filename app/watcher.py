@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+WATCH_MODES = ("off", "auto", "inotify", "poll")
+
+# Filesystems where inotify never sees changes made by other clients.
+_NETWORK_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "fuse.sshfs", "9p", "fuse.rclone", "davfs"}
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+# None asks the callback to re-check the whole tree (poll tick, lost events).
+ChangeCallback = Callable[[Optional[Set[str]]], None]
+
+
+def _is_network_fs(path: str) -> bool:
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split() for line in f]
+    except OSError:
+        return False
+
+    path = os.path.realpath(path)
+    best, best_type = "", ""
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+        mount_point = fields[1].replace("\\040", " ")
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best):
+            best, best_type = mount_point, fields[2]
+    return best_type in _NETWORK_FS_TYPES
+
+
+class _Inotify:
+    """Minimal ctypes binding for inotify, one watch per directory."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._add_watch.restype = ctypes.c_int
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self._rm_watch.restype = ctypes.c_int
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        # EINVAL when the kernel already dropped it; nothing to do then.
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self):
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset:offset + length].rstrip(b"\0")
+            offset += length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """Reports changed folders under music_dir to a callback.
+
+    With inotify every directory gets one watch (bounded by max_watches; past
+    that, or on network filesystems, it falls back to polling). Events are
+    collected into a set of changed folders and delivered once the tree has
+    been quiet for debounce seconds, so copying in a whole album triggers a
+    single update. Polling delivers None every poll_interval seconds, which
+    asks for a full mtime-based check.
+    """
+
+    def __init__(
+        self,
+        music_dir: str,
+        on_change: ChangeCallback,
+        mode: str = "auto",
+        debounce: float = 5.0,
+        poll_interval: float = 300.0,
+        max_watches: int = 65536,
+    ) -> None:
+        if mode not in WATCH_MODES:
+            raise ValueError(f"Invalid watch mode: {mode}")
+        self.music_dir = os.path.abspath(music_dir)
+        self.on_change = on_change
+        self.mode = mode
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_watches = max_watches
+        self.backend = "off"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._wd_to_dir: Dict[int, str] = {}
+        self._wake: Optional[Tuple[int, int]] = None  # pipe stop() writes to, waking the inotify loop
+
+    def start(self) -> None:
+        if self.mode == "off":
+            return
+        self._wake = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is None:
+            return
+        os.write(self._wake[1], b"\0")
+        self._thread.join(timeout=5)
+        if self._thread.is_alive():
+            # Still inside a callback: it closes its inotify fd on the way out,
+            # and the pipe stays open for the select it may return to.
+            logger.warning("Library watcher did not stop within 5s")
+            return
+        for fd in self._wake:
+            os.close(fd)
+        self._wake = None
+        self._thread = None
+
+    def _run(self) -> None:
+        # Only this thread reads the inotify fd, so only it closes it: closed
+        # from elsewhere, the number could be reused while a read is pending.
+        try:
+            use_inotify = self.mode == "inotify" or (self.mode == "auto" and not _is_network_fs(self.music_dir))
+            if use_inotify and self._start_inotify():
+                self.backend = "inotify"
+                logger.info(f"Watching {len(self._wd_to_dir)} folders with inotify")
+                self._inotify_loop()
+            else:
+                self.backend = "poll"
+                logger.info(f"Polling {self.music_dir} for changes every {self.poll_interval:.0f}s")
+                self._poll_loop()
+        finally:
+            self._close_inotify()
+
+    # inotify ---------------------------------------------------------------
+
+    def _start_inotify(self) -> bool:
+        try:
+            self._inotify = _Inotify()
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling")
+            return False
+        if not self._watch_tree(""):
+            self._close_inotify()
+            return False
+        return True
+
+    def _watch_tree(self, rel_dir: str) -> bool:
+        """Add watches for rel_dir and everything below it."""
+        assert self._inotify is not None
+        top = os.path.join(self.music_dir, rel_dir) if rel_dir else self.music_dir
+        for root, dirs, _ in os.walk(top):
+            if len(self._wd_to_dir) >= self.max_watches:
+                logger.warning(f"More than {self.max_watches} folders to watch, falling back to polling")
+                return False
+            try:
+                wd = self._inotify.add_watch(root)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logger.warning("inotify watch limit reached (fs.inotify.max_user_watches), falling back to polling")
+                    return False
+                dirs[:] = []
+                continue
+            rel = os.path.relpath(root, self.music_dir)
+            self._wd_to_dir[wd] = "" if rel == "." else rel
+        return True
+
+    def _unwatch_tree(self, rel_dir: str) -> None:
+        """Drop the watches of rel_dir and everything below it, e.g. after it moved away."""
+        assert self._inotify is not None
+        prefix = rel_dir + "/"
+        for wd, watched in list(self._wd_to_dir.items()):
+            if watched == rel_dir or watched.startswith(prefix):
+                self._inotify.rm_watch(wd)
+                del self._wd_to_dir[wd]
+
+    def _fall_back_to_polling(self) -> None:
+        self._close_inotify()
+        self.backend = "poll"
+        self._emit(None)
+        self._poll_loop()
+
+    def _inotify_loop(self) -> None:
+        assert self._inotify is not None
+        pending: Set[str] = set()
+        rescan_all = False
+        first_event = last_event = 0.0
+
+        while not self._stop.is_set():
+            timeout = 1.0
+            if pending or rescan_all:
+                timeout = max(0.0, min(timeout, last_event + self.debounce - time.monotonic()))
+            readable, _, _ = select.select([self._inotify.fd, self._wake[0]], [], [], timeout)
+
+            if self._inotify.fd in readable:
+                now = time.monotonic()
+                if not (pending or rescan_all):
+                    first_event = now
+                last_event = now
+                for wd, mask, name in self._inotify.read_events():
+                    if mask & _IN_Q_OVERFLOW:
+                        rescan_all = True
+                        continue
+                    rel_dir = self._wd_to_dir.get(wd)
+                    if mask & _IN_IGNORED:
+                        self._wd_to_dir.pop(wd, None)
+                        continue
+                    if rel_dir is None:
+                        continue
+                    if mask & _IN_MOVE_SELF:
+                        if rel_dir == "":
+                            # The music directory itself moved: its watches no longer describe it.
+                            logger.warning(f"{self.music_dir} was moved, falling back to polling")
+                            self._fall_back_to_polling()
+                            return
+                        continue  # the parent reports the move as IN_MOVED_FROM
+                    if mask & _IN_DELETE_SELF:
+                        continue  # the parent reports the deletion too
+                    pending.add(rel_dir)
+                    if not mask & _IN_ISDIR:
+                        continue
+                    child = os.path.join(rel_dir, name) if rel_dir else name
+                    if mask & _IN_MOVED_FROM:
+                        # Moved out (or renamed; IN_MOVED_TO watches the new name).
+                        self._unwatch_tree(child)
+                    elif mask & (_IN_CREATE | _IN_MOVED_TO):
+                        if not self._watch_tree(child):
+                            self._fall_back_to_polling()
+                            return
+
+            now = time.monotonic()
+            quiet = now - last_event >= self.debounce
+            # Don't hold changes back forever while a long copy is running.
+            overdue = now - first_event >= self.debounce * 12
+            if (pending or rescan_all) and (quiet or overdue):
+                self._emit(None if rescan_all else pending)
+                pending = set()
+                rescan_all = False
+
+    def _close_inotify(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._wd_to_dir.clear()
+
+    # polling ---------------------------------------------------------------
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self._emit(None)
+
+    def _emit(self, changed: Optional[Set[str]]) -> None:
+        try:
+            self.on_change(changed)
+        except Exception:
+            logger.exception("Library update after filesystem change failed")
@@ -56,6 +56,21 @@ async function renderQueueFromManager() {
     batchProgressEl.textContent = `Track ${progress.position + 1} of ${progress.total}`;
   }
   
+  // One request for the whole window instead of one per track
+  let metaById = null;
+  if (queueWindow.length > 0) {
+    try {
+      const res = await api('/api/tracks/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ids: queueWindow.map(item => item.id) }),
+      });
+      metaById = new Map(res.tracks.map(meta => [meta.id, meta]));
+    } catch (error) {
+      metaById = null;
+    }
+  }
+  
   for (const item of queueWindow) {
     const li = document.createElement('li');
     li.dataset.trackId = item.id;
@@ -64,10 +79,8 @@ async function renderQueueFromManager() {
       li.classList.add('current');
     }
     
-    // Fetch track metadata for display
-    try {
-      const meta = await api(`/api/tracks/${item.id}`);
-      
+    const meta = metaById ? metaById.get(item.id) : undefined;
+    if (meta) {
       const title = document.createElement('div');
       title.className = 'queueItemTitle';
       title.textContent = meta.title || meta.filename || item.id;
@@ -94,7 +107,7 @@ async function renderQueueFromManager() {
         dateInfo.textContent = `Added: ${dateStr} ${timeStr}`;
         li.appendChild(dateInfo);
       }
-    } catch (error) {
+    } else {
       // Fallback if metadata fetch fails
       const title = document.createElement('div');
       title.className = 'queueItemTitle';
@@ -134,7 +147,10 @@ function setCover(trackId) {
   coverEl.innerHTML = '';
   const img = document.createElement('img');
   img.alt = 'cover';
-  img.src = `/api/tracks/${trackId}/cover`;
+  // Thumbnail where it is enough, the original on large or high-DPI screens.
+  img.src = `/api/tracks/${trackId}/cover?size=256`;
+  img.srcset = `/api/tracks/${trackId}/cover?size=256 256w, /api/tracks/${trackId}/cover 1024w`;
+  img.sizes = '(max-width: 768px) 100vw, 45vw';
   img.onerror = () => {
     coverEl.innerHTML = 'No cover';
   };
@@ -179,8 +195,31 @@ async function prevTrack() {
   }
 }
 
+// Poll a background rescan until it finishes, showing progress on the button.
+async function waitForRescan(status) {
+  const btn = document.getElementById('rescanBtn');
+  const label = btn.textContent;
+  btn.disabled = true;
+  try {
+    while (['pending', 'running', 'cancelling'].includes(status.state)) {
+      const total = status.expected_folders ? ` / ${status.expected_folders}` : '';
+      const eta = status.eta_seconds != null ? ` (~${Math.ceil(status.eta_seconds)}s)` : '';
+      btn.textContent = `Scanning ${status.folders}${total} folders${eta}`;
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      status = await api('/api/rescan/status');
+    }
+  } finally {
+    btn.textContent = label;
+    btn.disabled = false;
+  }
+  return status;
+}
+
 async function refreshQueue() {
-  await api('/api/rescan', { method: 'POST' });
+  const status = await waitForRescan(await api('/api/rescan', { method: 'POST' }));
+  if (status.state === 'failed') {
+    console.error('Rescan failed:', status.error);
+  }
   // Queue manager will handle library changes on next batch request
   if (queueManager) {
     await queueManager.fetchNewBatch();
@@ -319,10 +358,13 @@ function updateMediaSession(meta) {
   
   const artwork = [];
   if (meta.id) {
+    artwork.push({
+      src: `/api/tracks/${meta.id}/cover?size=256`,
+      sizes: '256x256'
+    });
     artwork.push({
       src: `/api/tracks/${meta.id}/cover`,
-      sizes: '512x512',
-      type: 'image/jpeg'
+      sizes: '512x512'
     });
   }
   
@@ -503,6 +545,25 @@ audio.addEventListener('ended', async () => {
   await nextTrack();
 });
 
+// Live updates: the server pushes library changes (rescans, the folder
+// watcher) over Server-Sent Events. EventSource reconnects on its own and
+// sends Last-Event-ID, so the server only replays what was missed.
+let libraryVersion = null;
+
+function subscribeEvents() {
+  if (!window.EventSource) return;
+  const source = new EventSource('/api/events');
+  const onLibrary = (info) => {
+    if (libraryVersion !== null && info.library_version !== libraryVersion) {
+      // Tracks in the queue may have been renamed, retagged or removed
+      renderQueueFromManager();
+    }
+    libraryVersion = info.library_version;
+  };
+  source.addEventListener('state', (e) => onLibrary(JSON.parse(e.data).library));
+  source.addEventListener('library', (e) => onLibrary(JSON.parse(e.data)));
+}
+
 // Initialize the application
 async function initApp() {
   try {
@@ -529,6 +590,8 @@ async function initApp() {
     const settings = queueManager.settings;
     updateModeUI(settings.mode, settings.time_margin_days, settings.date_type);
     
+    subscribeEvents();
+    
     console.log('App initialized with personal queue');
   } catch (error) {
     console.error('Failed to initialize app:', error);
@@ -23,6 +23,8 @@ class ClientQueueManager {
         };
         this.generatedAt = null;
         this.totalAvailable = 0;
+        this.nextCursor = null;  // continues the same shuffle on the server
+        this.prefetching = false;
         
         // Initialize
         this.loadFromStorage();
@@ -43,6 +45,7 @@ class ClientQueueManager {
                     this.settings = data.settings || this.settings;
                     this.generatedAt = data.generatedAt || null;
                     this.totalAvailable = data.totalAvailable || 0;
+                    this.nextCursor = data.nextCursor || null;
                     
                     // Ensure position is within bounds
                     if (this.position >= this.batch.length) {
@@ -71,6 +74,7 @@ class ClientQueueManager {
                 settings: this.settings,
                 generatedAt: this.generatedAt,
                 totalAvailable: this.totalAvailable,
+                nextCursor: this.nextCursor,
                 savedAt: Date.now()
             };
             localStorage.setItem(this.storageKey, JSON.stringify(data));
@@ -81,9 +85,11 @@ class ClientQueueManager {
     
     clearStorage() {
         localStorage.removeItem(this.storageKey);
+        localStorage.removeItem(`${this.storageKey}_prefetch`);
         this.batch = [];
         this.position = 0;
         this.batchId = null;
+        this.nextCursor = null;
     }
     
     // Queue navigation
@@ -101,8 +107,9 @@ class ClientQueueManager {
         
         this.position++;
         
-        // Wrap around if at end
-        if (this.position >= this.batch.length) {
+        // Continue with the next page of the shuffle, or wrap around if it
+        // hasn't arrived yet
+        if (this.position >= this.batch.length && !this.usePrefetchedBatch()) {
             this.position = 0;
         }
         
@@ -171,8 +178,11 @@ class ClientQueueManager {
             this.generatedAt = data.generated_at;
             this.totalAvailable = data.total_available;
             this.settings = data.settings;
+            this.nextCursor = data.next_cursor || null;
             this.position = 0;
             
+            // A prefetched page belongs to the previous shuffle
+            localStorage.removeItem(`${this.storageKey}_prefetch`);
             this.saveToStorage();
             
             console.log('Fetched new batch:', {
@@ -193,39 +203,55 @@ class ClientQueueManager {
             return;
         }
         
-        // Don't prefetch if already at the end of a very small batch
-        if (this.batch.length <= this.prefetchThreshold) {
+        // Nothing to fetch if this batch already holds every matching track
+        if (!this.nextCursor && this.batch.length >= this.totalAvailable) {
             return;
         }
         
+        // One prefetch per page: the cursor identifies what comes next
+        const cursor = this.nextCursor;
+        const pending = localStorage.getItem(`${this.storageKey}_prefetch`);
+        if (this.prefetching || (pending && JSON.parse(pending).requested_cursor === cursor)) {
+            return;
+        }
+        
+        this.prefetching = true;
         try {
-            // Prefetch in background
-            const response = await fetch('/api/queue/batch', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    size: this.batchSize,
-                    mode: this.settings.mode,
-                    time_margin_days: this.settings.time_margin_days,
-                    date_type: this.settings.date_type,
-                    seed: this.generateSeed() + '_prefetch'
-                })
-            });
+            // Prefetch in background. With a cursor the server continues the
+            // same shuffle (no repeats) via the cacheable GET form; once it is
+            // exhausted, start a new one.
+            const response = cursor
+                ? await fetch('/api/queue/batch?' + new URLSearchParams({ size: this.batchSize, cursor: cursor }))
+                : await fetch('/api/queue/batch', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify({
+                        size: this.batchSize,
+                        mode: this.settings.mode,
+                        time_margin_days: this.settings.time_margin_days,
+                        date_type: this.settings.date_type,
+                        seed: this.generateSeed()
+                    })
+                });
             
-            if (response.ok) {
+            if (response.ok && this.nextCursor === cursor) {
                 const data = await response.json();
                 console.log('Prefetched next batch:', {
                     size: data.track_ids.length,
-                    batchId: data.batch_id
+                    batchId: data.batch_id,
+                    offset: data.offset
                 });
                 
                 // Store prefetched batch for later use
+                data.requested_cursor = cursor;
                 localStorage.setItem(`${this.storageKey}_prefetch`, JSON.stringify(data));
             }
         } catch (error) {
             console.error('Failed to prefetch batch:', error);
+        } finally {
+            this.prefetching = false;
         }
     }
     
@@ -245,6 +271,11 @@ class ClientQueueManager {
             const prefetched = localStorage.getItem(`${this.storageKey}_prefetch`);
             if (prefetched) {
                 const data = JSON.parse(prefetched);
+                if (data.requested_cursor !== this.nextCursor) {
+                    // Prefetched for a queue we have since replaced
+                    localStorage.removeItem(`${this.storageKey}_prefetch`);
+                    return false;
+                }
                 
                 // Switch to prefetched batch
                 this.batch = data.track_ids;
@@ -252,6 +283,7 @@ class ClientQueueManager {
                 this.generatedAt = data.generated_at;
                 this.totalAvailable = data.total_available;
                 this.settings = data.settings;
+                this.nextCursor = data.next_cursor || null;
                 this.position = 0;
                 
                 // Clear prefetched data